@@ -0,0 +1,381 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns, MaterialCompositions, TestRecord, TrackedBoard, WrappedBoard
+
+from chess import A1, A2, A3, A4, A5, B3, B4, B5, B6, C1, Piece, SquareSet
+from argparse import ArgumentParser
+from itertools import combinations_with_replacement
+from json import dump, load
+from os.path import abspath, exists, join
+from platform import python_version
+from random import Random
+from tempfile import TemporaryDirectory
+from time import time
+import tracemalloc
+
+
+def lone_pawn_positions():
+    """Positions where the horde is a lone pawn against a variety of black material."""
+    black_sides = ["", "p", "r", "pp", "pr", "bb", "nb", "pnb", "rnb", "ppnb", "qqqq", "pbnrq"]
+    boards = []
+    for pawn_square in [12, 27, 42, 53]:
+        for black_side in black_sides:
+            board = WrappedBoard()
+            board.set_piece_at(0, Piece.from_symbol("k"))
+            board.set_piece_at(pawn_square, Piece.from_symbol("P"))
+            for sq, piece in zip([8, 9, 16, 17, 24], black_side):
+                board.set_piece_at(sq, Piece.from_symbol(piece))
+            boards.append(board)
+    return boards
+
+
+def promote_by_setting_up_boards(board):
+    """The lone pawn rule as it used to be evaluated; by setting up both promoted positions."""
+    pawn_square = SquareSet(board.pawns & board.occupied_co[True]).pop()
+    promote_to_queen = WrappedBoard(board.fen())
+    promote_to_queen.set_piece_at(pawn_square, Piece.from_symbol("Q"))
+    promote_to_knight = WrappedBoard(board.fen())
+    promote_to_knight.set_piece_at(pawn_square, Piece.from_symbol("N"))
+    return promote_to_queen.has_insufficient_material(True) and promote_to_knight.has_insufficient_material(True)
+
+
+def measure(function, boards, repeat):
+    """Returns the number of boards assessed per second."""
+    start = time()
+    for _ in range(repeat):
+        for board in boards:
+            function(board)
+    return repeat*len(boards)/(time()-start)
+
+
+def benchmark_lone_pawn(repeat=200):
+    boards = lone_pawn_positions()
+    for board in boards:
+        if promote_by_setting_up_boards(board) != board.has_insufficient_material(True):
+            board.print()
+            raise Exception("The lone pawn verdicts differ")
+
+    before = measure(promote_by_setting_up_boards, boards, repeat)
+    after = measure(lambda board: board.has_insufficient_material(True), boards, repeat)
+    compiled = measure(lambda board: board.has_insufficient_material_compiled(True), boards, repeat)
+
+    print("Lone pawn against", len(boards), "black sides:")
+    print("  promoted boards set up:", int(before), "positions/s")
+    print("  promoted from counts:  ", int(after), "positions/s", "(x"+str(round(after/before,1))+")")
+    print("  compiled table:        ", int(compiled), "positions/s", "(x"+str(round(compiled/before,1))+")")
+
+
+def black_side_by_copying_boards(generator, king_board, black_side_num):
+    """The brute force search over the black side as it used to be; every node is a FEN copy of its parent."""
+    def rec(board, black_num):
+        if black_num==0:
+            return None
+        sq = board.get_empty_square()
+        for black in "pbnrq":
+            temp_board = board.deepcopy()
+            temp_board.set_piece_at(sq,Piece.from_symbol(black))
+            temp_board.compute_white_composition()
+            temp_board.compute_black_composition()
+            temp_board.is_insufficient = not generator.has_sufficient_subset(temp_board)
+            output.append(temp_board)
+            if not temp_board.is_insufficient:
+                rec(temp_board, min(black_num-1,2))
+            else:
+                rec(temp_board, black_num-1)
+    output = []
+    rec(king_board, black_side_num)
+    return output
+
+
+def benchmark_brute_force_search(max_black_pieces=5):
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+
+    king_board = WrappedBoard()
+    king_board.set_piece_at(A1, Piece.from_symbol("k"))
+    start = time()
+    nodes = len(black_side_by_copying_boards(generator, king_board, max_black_pieces))
+    before = nodes/(time()-start)
+
+    # Without white sides the search runs but no test gets added.
+    start = time()
+    generator.brute_force_and_assess_positions(max_black_pieces, whites=[])
+    after = nodes/(time()-start)
+
+    print("Brute force search over", nodes, "black sides:")
+    print("  copying boards:", int(before), "nodes/s")
+    print("  make/unmake:   ", int(after), "nodes/s", "(x"+str(round(after/before,1))+")")
+
+
+def benchmark_tracked_board(games=200, seed=2024):
+    """has_insufficient_material after every move of random horde games; assessed on every move and tracked."""
+    random = Random(seed)
+    games = [ random_game(random) for _ in range(games) ]
+    moves = sum( len(game) for game in games )
+
+    def replay(board_type):
+        start = time()
+        for game in games:
+            board = board_type("rnbqkbnr/pppppppp/8/1PP2PP1/PPPPPPPP/PPPPPPPP/PPPPPPPP/PPPPPPPP w kq - 0 1")
+            for move in game:
+                board.push(move)
+                board.has_insufficient_material(True)
+        return moves/(time()-start)
+
+    before = replay(WrappedBoard)
+    after = replay(TrackedBoard)
+    print("has_insufficient_material after each of", moves, "moves:")
+    print("  assessed:", int(before), "moves/s")
+    print("  tracked: ", int(after), "moves/s", "(x"+str(round(after/before,1))+")")
+
+
+def random_game(random, max_moves=150):
+    """The moves of a random game from the starting position of horde."""
+    board = WrappedBoard("rnbqkbnr/pppppppp/8/1PP2PP1/PPPPPPPP/PPPPPPPP/PPPPPPPP/PPPPPPPP w kq - 0 1")
+    for _ in range(max_moves):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(random.choice(moves))
+    return board.move_stack
+
+
+
+
+# The suite
+
+# The white sides of every rule branch of has_insufficient_material.
+BRANCHES = [
+    ("lone queen", ["Q"]),
+    ("lone rook", ["R"]),
+    ("lone bishop", ["B"]),
+    ("lone knight", ["N"]),
+    ("lone pawn", ["P"]),
+    ("two minor pieces", ["BN", "NN", "BB"]),
+    ("three pieces", [ "".join(side) for side in combinations_with_replacement("PNBRQ", 3) ]),
+    ("four or more pieces", [ "".join(side) for n in (4,5,6) for side in combinations_with_replacement("PNBRQ", n) ]),
+    ]
+
+# The white compositions of the default white sides of brute_force_and_assess_positions.
+WHITE_COMPOSITIONS = [
+    (0,0,0,0,1,0,0), (1,0,0,0,0,0,0), (0,0,1,0,0,0,0), (0,0,0,1,0,0,0),
+    (0,1,0,0,0,1,0), (1,0,0,0,1,0,0), (0,0,1,1,0,0,0), (0,1,0,1,0,1,0),
+    (0,0,2,0,0,0,0), (0,2,0,0,0,1,1), (0,2,0,0,0,2,0), (0,1,1,0,0,1,0),
+    ]
+
+
+def random_position(random, white_side, max_black_pieces=8):
+    """A black king, the 'white_side' and up to 'max_black_pieces' black pieces on random squares."""
+    board = WrappedBoard()
+    squares = list(range(64))
+    random.shuffle(squares)
+    board.set_piece_at(squares.pop(), Piece.from_symbol("k"))
+    pieces = list(white_side) + [ random.choice("pbnrq") for _ in range(random.randint(0, max_black_pieces)) ]
+    for symbol in pieces:
+        square = next( sq for sq in squares if symbol not in "Pp" or not WrappedBoard.is_backrank(sq) )
+        squares.remove(square)
+        board.set_piece_at(square, Piece.from_symbol(symbol))
+    return board
+
+
+def position_corpus(seed, size=500):
+    """A fixed corpus of 'size' positions for every rule branch; the same for the same seed."""
+    random = Random(seed)
+    return [ (branch, [ random_position(random, random.choice(white_sides)) for _ in range(size) ]) for branch, white_sides in BRANCHES ]
+
+
+def random_antichain(random, size):
+    """
+    A MaterialCompositions of 'size' compositions. The black compositions with
+    the same number of pieces are not subsets of one another, so they all stay.
+    """
+    antichain = MaterialCompositions()
+    compositions = set()
+    while len(compositions) < size:
+        knights, rooks, queens, dark, light = [ random.randint(0,3) for _ in range(5) ]
+        pawns = 7 - knights - rooks - queens - dark - light
+        if pawns < 0:
+            continue
+        compositions.add( (random.choice(WHITE_COMPOSITIONS), (pawns, dark+light, knights, rooks, queens, dark, light)) )
+    antichain.merge( (white_comp, black_comp, None) for white_comp, black_comp in sorted(compositions) )
+    if len(antichain) != size:
+        raise Exception("The antichain has "+str(len(antichain))+" compositions instead of "+str(size))
+    return antichain
+
+
+def random_queries(random, size):
+    """Records with random compositions for the subset queries."""
+    queries = []
+    for _ in range(size):
+        black = [ random.randint(0,3) for _ in range(6) ]
+        pawns, knights, rooks, queens, dark, light = black
+        queries.append( TestRecord(0, random.choice(WHITE_COMPOSITIONS), (pawns, dark+light, knights, rooks, queens, dark, light), True) )
+    return queries
+
+
+def has_insufficient_material_cases(seed, repeat=20):
+    cases = []
+    for branch, boards in position_corpus(seed):
+        def work(boards=boards):
+            for _ in range(repeat):
+                for board in boards:
+                    board.has_insufficient_material(True)
+        cases.append( ("has_insufficient_material/"+branch, work, repeat*len(boards), "positions/s") )
+    return cases
+
+
+def exists_subset_of_cases(seed, sizes=(10, 100, 1000, 5000), repeat=5):
+    random = Random(seed)
+    queries = random_queries(random, 2000)
+    cases = []
+    for size in sizes:
+        antichain = random_antichain(random, size)
+        def work(antichain=antichain):
+            for _ in range(repeat):
+                for query in queries:
+                    # The verdict is cached on the record otherwise.
+                    query.sufficient_subset = None
+                    antichain.exists_subset_of(query)
+        cases.append( ("exists_subset_of/"+str(size)+" compositions", work, repeat*len(queries), "queries/s") )
+    return cases
+
+
+def add_pattern_cases():
+    # The largest pattern of the script, with its anti-patterns.
+    def work():
+        generator = GenerateTestsFromPatterns()
+        generator.add_pattern(
+            "white=N",
+            [(B5,"pbn"),(A5,"pnr"),(A3,"pbnrq"),(B3,"pbnrq"),(B4,"pbnrq")],
+            black_king_square=A4,
+            white=[(B6,"N")]
+            )
+        return len(generator)
+    return [ ("add_pattern", work, work(), "tests/s") ]
+
+
+def brute_force_cases(max_black_pieces=6):
+    cases = []
+    for k in range(3, max_black_pieces+1):
+        def work(k=k):
+            generator = GenerateTestsFromPatterns()
+            generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+            generator.brute_force_and_assess_positions(k)
+            return len(generator)
+        cases.append( ("brute_force_and_assess_positions/"+str(k), work, work(), "tests/s") )
+    return cases
+
+
+def export_to_cases(directory):
+    generator = GenerateTestsFromPatterns()
+    generator.generate_patterns()
+    generator.correct_contradictions()
+    def work():
+        generator.export_to(
+            join(directory, "tests"),
+            "",
+            lambda board: board.fen()+','+str(board.is_insufficient).lower()+','+board.comment+'\n',
+            ""
+            )
+    return [ ("export_to", work, len(generator), "tests/s") ]
+
+
+def run_case(work, units, rounds):
+    """Returns the throughput of the fastest of 'rounds' runs and the peak of the traced memory of one more run."""
+    seconds = []
+    for _ in range(rounds):
+        start = time()
+        work()
+        seconds.append(time()-start)
+    tracemalloc.start()
+    work()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return units/min(seconds), peak_memory
+
+
+def run_suite(seed=2024, rounds=3, max_black_pieces=6, only=None):
+    """
+    Runs the benchmarks, or the ones whose name starts with one of 'only', and returns
+    {name: {"throughput", "unit", "peak_memory"}}. The peak memory is the peak of the
+    memory that Python allocated while the benchmark ran once more under tracemalloc.
+    """
+    selected = lambda prefix: not only or any( name.startswith(prefix) or prefix.startswith(name) for name in only )
+    results = dict()
+    with TemporaryDirectory() as directory:
+        suite = [
+            ("has_insufficient_material", lambda: has_insufficient_material_cases(seed)),
+            ("exists_subset_of", lambda: exists_subset_of_cases(seed)),
+            ("add_pattern", add_pattern_cases),
+            ("brute_force_and_assess_positions", lambda: brute_force_cases(max_black_pieces)),
+            ("export_to", lambda: export_to_cases(directory)),
+            ]
+        for prefix, cases in suite:
+            if not selected(prefix):
+                continue
+            for name, work, units, unit in cases():
+                if only and not any( name.startswith(prefix) for prefix in only ):
+                    continue
+                throughput, peak_memory = run_case(work, units, rounds)
+                results[name] = {"throughput": throughput, "unit": unit, "peak_memory": peak_memory}
+                print("  "+name+":", int(throughput), unit+",", "peak", round(peak_memory/1024), "KiB", flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the results against the ones of a baseline and returns the names of the
+    benchmarks that got slower, or use more memory, by more than 'tolerance'.
+    A growth of the peak memory below 64KiB does not count.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print("  "+name+": not in the baseline")
+            continue
+        speed = result["throughput"]/baseline[name]["throughput"]
+        memory = result["peak_memory"]/max(baseline[name]["peak_memory"], 1)
+        regressed = speed < 1-tolerance or (memory > 1+tolerance and result["peak_memory"]-baseline[name]["peak_memory"] > 64*1024)
+        if regressed:
+            regressions.append(name)
+        print("  "+name+":", "x"+str(round(speed,2)), "throughput,", "x"+str(round(memory,2)), "peak memory", "(REGRESSION)" if regressed else "")
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Benchmarks of the hot paths of the classifier and the generator of the tests.")
+    parser.add_argument("--baseline", default=abspath("./benchmark_baseline.json"), help="the stored results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=.2, help="the slowdown or memory growth that counts as a regression")
+    parser.add_argument("--seed", type=int, default=2024, help="the seed of the position corpora and the antichains")
+    parser.add_argument("--rounds", type=int, default=3, help="the throughput is the one of the fastest round")
+    parser.add_argument("--max-black-pieces", type=int, default=6, help="brute_force_and_assess_positions runs for 3 up to that")
+    parser.add_argument("--only", nargs="*", help="the benchmarks whose name starts with one of these")
+    parser.add_argument("--history", action="store_true", help="compare the lone pawn rule, the brute force search and the tracked boards with the approaches they replaced too")
+    arguments = parser.parse_args()
+
+    print("Benchmarks (seed "+str(arguments.seed)+"):")
+    results = run_suite(arguments.seed, arguments.rounds, arguments.max_black_pieces, arguments.only)
+
+    regressions = []
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w") as file:
+            dump({"seed": arguments.seed, "python": python_version(), "results": results}, file, indent=2)
+        print("The baseline was stored at '"+arguments.baseline+"'")
+    elif exists(arguments.baseline):
+        with open(arguments.baseline) as file:
+            baseline = load(file)
+        if baseline["seed"] != arguments.seed:
+            print("The baseline was measured with the seed", baseline["seed"], "and is not comparable")
+        else:
+            print("Against the baseline at '"+arguments.baseline+"':")
+            regressions = compare(results, baseline["results"], arguments.tolerance)
+    else:
+        print("There is no baseline at '"+arguments.baseline+"'; store one with --save-baseline")
+
+    if arguments.history:
+        benchmark_lone_pawn()
+        benchmark_brute_force_search()
+        benchmark_tracked_board()
+
+    if regressions:
+        raise SystemExit("Regressions: "+", ".join(regressions))
@@ -0,0 +1,15 @@
+from generate_horde_insufficient_material_tests import MaterialSignatureTable
+
+from time import time
+
+
+if __name__ == "__main__":
+
+    start = time()
+
+    print("Compiling the material signature table...")
+
+    table = MaterialSignatureTable.compile()
+    table.save()
+
+    print("The table was written at '"+MaterialSignatureTable.path+"' in "+str(time()-start)+"s.")
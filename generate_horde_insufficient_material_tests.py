@@ -8,11 +8,20 @@ from chess import ( A1, A2, A3, A4, A5, A6, A7, A8,
                     F1, F2, F3, F4, F5, F6, F7, F8,
                     G1, G2, G3, G4, G5, G6, G7, G8,
                     H1, H2, H3, H4, H5, H6, H7, H8 )
-from chess import popcount, square, square_name, square_file, square_rank
-
-from copy import deepcopy
-from os.path import abspath
+from chess import BB_SQUARES, flip_anti_diagonal, flip_diagonal, flip_horizontal, flip_vertical
+from chess import msb, popcount, square, square_name, square_file, square_rank
+
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import wraps
+from itertools import combinations_with_replacement, product
+from json import dump, dumps as dumps_json, loads as loads_json
+from os import remove, replace
+from os.path import abspath, dirname, exists, join
+from shutil import copyfile
 from time import time
+from zlib import compress, decompress
 
 
 class WrappedBoard(Board):
@@ -34,17 +43,71 @@ class WrappedBoard(Board):
         """Gets an empty square not in the backranks."""
         return SquareSet(72057594037927680).difference(self.occupied).pop()
 
+    # The symmetries of the board as (name, bitboard transform, does it swap the square colours).
+    # Only the first two keep every rank in place, so only they are valid when there are pawns.
+    SYMMETRIES = (
+        ("identity", lambda bb: bb, False),
+        ("flip_files", flip_horizontal, True),
+        ("flip_ranks", flip_vertical, True),
+        ("rotate_180", lambda bb: flip_vertical(flip_horizontal(bb)), False),
+        ("transpose", flip_diagonal, False),
+        ("anti_transpose", flip_anti_diagonal, False),
+        ("rotate_90", lambda bb: flip_horizontal(flip_diagonal(bb)), True),
+        ("rotate_270", lambda bb: flip_vertical(flip_diagonal(bb)), True),
+        )
+
+    @staticmethod
+    def mirror_composition(composition):
+        """Swaps the dark and light square bishops of a composition."""
+        return composition[:5]+(composition[6],composition[5])
+
+    def symmetries(self):
+        """The SYMMETRIES that are valid for the position."""
+        return self.SYMMETRIES[:2] if self.pawns else self.SYMMETRIES
+
+    def transform_symmetry(self, symmetry):
+        """
+        Returns the image of the board under one of the SYMMETRIES.
+
+        The piece masks are transformed as bitboards and the compositions, when
+        they are computed, follow the bishops that change square colour.
+        """
+        name, transform, swaps_colours = symmetry
+        board = self.transform(transform)
+        board.comment = self.comment
+        board.is_insufficient = self.is_insufficient
+        if hasattr(self, "white_composition"):
+            board.white_composition = self.mirror_composition(self.white_composition) if swaps_colours else self.white_composition
+        if hasattr(self, "black_composition"):
+            board.black_composition = self.mirror_composition(self.black_composition) if swaps_colours else self.black_composition
+        return board
+
     def mirror_vertical(self):
-        mirrored = WrappedBoard('8/8/8/8/8/8/8/8 b - - 0 1', self.comment, self.is_insufficient)
-        for i in range(8):
-            for j in range(8):
-                sq = square(i,j)
-                piece = self.piece_at(sq)
-                if piece:
-                    mirrored.set_piece_at(self.mirror_square(sq), piece)
-        mirrored.compute_white_composition()
-        mirrored.compute_black_composition()
-        return mirrored
+        """The board mirrored along the vertical axis, i.e. with its files flipped."""
+        return self.transform_symmetry(self.SYMMETRIES[1])
+
+    @staticmethod
+    def transform_position_key(key, transform):
+        """Applies a bitboard transform to a 'position_key' without setting up a board."""
+        mask = 0xffff_ffff_ffff_ffff
+        ep_square = key>>257&127
+        if ep_square != 64:
+            ep_square = msb(transform(BB_SQUARES[ep_square]))
+        return (
+            transform(key&mask) |
+            transform(key>>64&mask)<<64 |
+            transform(key>>128&mask)<<128 |
+            transform(key>>192&mask)<<192 |
+            key&1<<256 |
+            ep_square<<257 |
+            transform(key>>264&mask)<<264 |
+            key>>328<<328
+            )
+
+    def canonical_key(self):
+        """The smallest 'position_key' of the images of the position under its valid symmetries."""
+        key = self.position_key()
+        return min( WrappedBoard.transform_position_key(key, transform) for name, transform, swaps_colours in self.symmetries() )
 
     def compute_white_composition(self):
         """
@@ -98,7 +161,61 @@ class WrappedBoard(Board):
         return other <= self
 
     def deepcopy(self):
-        return WrappedBoard(self.fen(), self.comment, self.is_insufficient)
+        board = self.copy(stack=False)
+        board.comment = self.comment
+        board.is_insufficient = self.is_insufficient
+        return board
+
+    def position_key(self):
+        """
+        An integer that tells positions apart like their FEN does and is much cheaper to get.
+
+        The piece types are packed in three bitplanes (pawn=1, ..., king=6), followed by
+        the black pieces, the side to move, the en passant square, the castling rights
+        and the move counters.
+        """
+        return (
+            (self.pawns|self.bishops|self.queens) |
+            (self.knights|self.bishops|self.kings)<<64 |
+            (self.rooks|self.queens|self.kings)<<128 |
+            self.occupied_co[0]<<192 |
+            self.turn<<256 |
+            (64 if self.ep_square is None else self.ep_square)<<257 |
+            self.castling_rights<<264 |
+            self.halfmove_clock<<328 |
+            self.fullmove_number<<360
+            )
+
+    @classmethod
+    def from_position_key(cls, key, name="", is_insufficient=True):
+        """Sets up a board from its 'position_key' without parsing a FEN."""
+        board = cls(None, name, is_insufficient)
+        (
+            board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            board.occupied_co[0], board.occupied_co[1], board.turn, board.ep_square,
+            board.castling_rights, board.halfmove_clock, board.fullmove_number
+            ) = cls.unpack_position_key(key)
+        board.occupied = board.occupied_co[0] | board.occupied_co[1]
+        return board
+
+    @staticmethod
+    def unpack_position_key(key):
+        """
+        Returns the bitboards of the pawns, knights, bishops, rooks, queens, kings,
+        black and white pieces, followed by the side to move, the en passant square,
+        the castling rights and the move counters of a 'position_key'.
+        """
+        mask = 0xffff_ffff_ffff_ffff
+        plane0, plane1, plane2 = key&mask, key>>64&mask, key>>128&mask
+        black = key>>192&mask
+        ep_square = key>>257&127
+        return (
+            plane0&~plane1&~plane2, plane1&~plane0&~plane2, plane0&plane1&~plane2,
+            plane2&~plane0&~plane1, plane2&plane0&~plane1, plane2&plane1&~plane0,
+            black, (plane0|plane1|plane2)&~black,
+            bool(key>>256&1), None if ep_square == 64 else ep_square,
+            key>>264&mask, key>>328&0xffff_ffff, key>>360
+            )
 
     def print(self):
         print( "\n".join([self.comment,self.__str__(),self.fen(),str(self.is_insufficient)])+"\n" )
@@ -163,32 +280,49 @@ class WrappedBoard(Board):
                 return False
 
         if horde_num == 1:
+            # A lone queen mates a king on A1 bounded by:
+            #  -- a pawn/rook on A2
+            #  -- two same color bishops on A2, B1
+            # We ignore every other mating case, since it can be reduced to
+            # the two previous cases (e.g. a black pawn on A2 and a black
+            # bishop on B1).
+            lone_queen_is_insufficient = lambda : not (
+                    pieces_pawns >= 1 or
+                    pieces_rooks >= 1 or
+                    pieces_lightb() >= 2 or
+                    pieces_darkb() >= 2
+                    )
+            lone_knight_is_insufficient = lambda : not (
+                    # The king on A1 can be smother mated by a knight on C2 if there is
+                    # a pawn/knight/bishop on B2, a knight/rook on B1 and any other piece
+                    # on A2.
+                    # Moreover, when black has four or more pieces and two of them are
+                    # pawns, black can promote their pawns and selfmate theirself.
+                    pieces_num >= 4 and (
+                        pieces_knights>=2 or pieces_pawns>=2 or
+                        (pieces_rooks>=1 and pieces_knights>=1) or
+                        (pieces_rooks>=1 and pieces_bishops>=1) or
+                        (pieces_knights>=1 and pieces_bishops>=1) or
+                        (pieces_rooks>=1 and pieces_pawns>=1) or
+                        (pieces_knights>=1 and pieces_pawns>=1) or
+                        (pieces_bishops>=1 and pieces_pawns>=1) or
+                        (has_bishop_pair(chess.BLACK) and pieces_pawns>=1)
+                    ) and ( pieces_of_type_not(pieces_darkb())>=3 if pieces_darkb()>=2 else True )
+                    and ( pieces_of_type_not(pieces_lightb())>=3 if pieces_lightb()>=2 else True )
+                )
+
             if pieces_num == 1:
                 # A lone piece cannot mate a lone king.
                 return True
             elif queens == 1:
                 # The horde has a lone queen.
-                # A lone queen mates a king on A1 bounded by:
-                #  -- a pawn/rook on A2
-                #  -- two same color bishops on A2, B1
-                # We ignore every other mating case, since it can be reduced to
-                # the two previous cases (e.g. a black pawn on A2 and a black
-                # bishop on B1).
-                return not (
-                        pieces_pawns >= 1 or
-                        pieces_rooks >= 1 or
-                        pieces_lightb() >= 2 or
-                        pieces_darkb() >= 2
-                        )
+                return lone_queen_is_insufficient()
             elif pawns == 1:
                 # Promote the pawn to a queen or a knight and check whether white
-                # can mate.
-                pawn_square = chess.SquareSet(self.pawns & white).pop()
-                promote_to_queen = WrappedBoard(self.fen())
-                promote_to_queen.set_piece_at( pawn_square, chess.Piece(chess.QUEEN,chess.WHITE) )
-                promote_to_knight = WrappedBoard(self.fen())
-                promote_to_knight.set_piece_at( pawn_square, chess.Piece(chess.KNIGHT,chess.WHITE) )
-                return promote_to_queen.has_insufficient_material(chess.WHITE) and promote_to_knight.has_insufficient_material(chess.WHITE)
+                # can mate. The promoted piece is still the only white piece and
+                # black's material stays the same, so there is no need to set up
+                # the promoted positions.
+                return lone_queen_is_insufficient() and lone_knight_is_insufficient()
             elif rooks == 1:
                 # A lone rook mates a king on A8 bounded by a pawn/rook on A7 and a
                 # pawn/knight on B7. We ignore every other case, since it can be
@@ -220,24 +354,7 @@ class WrappedBoard(Board):
                     )
             elif knights == 1:
                 # The horde has a lone knight.
-                return not (
-                        # The king on A1 can be smother mated by a knight on C2 if there is
-                        # a pawn/knight/bishop on B2, a knight/rook on B1 and any other piece
-                        # on A2.
-                        # Moreover, when black has four or more pieces and two of them are
-                        # pawns, black can promote their pawns and selfmate theirself.
-                        pieces_num >= 4 and (
-                            pieces_knights>=2 or pieces_pawns>=2 or
-                            (pieces_rooks>=1 and pieces_knights>=1) or
-                            (pieces_rooks>=1 and pieces_bishops>=1) or
-                            (pieces_knights>=1 and pieces_bishops>=1) or
-                            (pieces_rooks>=1 and pieces_pawns>=1) or
-                            (pieces_knights>=1 and pieces_pawns>=1) or
-                            (pieces_bishops>=1 and pieces_pawns>=1) or
-                            (has_bishop_pair(chess.BLACK) and pieces_pawns>=1)
-                        ) and ( pieces_of_type_not(pieces_darkb())>=3 if pieces_darkb()>=2 else True )
-                        and ( pieces_of_type_not(pieces_lightb())>=3 if pieces_lightb()>=2 else True )
-                    )
+                return lone_knight_is_insufficient()
 
         # By this point, we only need to deal with white's minor pieces.
 
@@ -305,13 +422,566 @@ class WrappedBoard(Board):
 
         return True
 
+    def has_insufficient_material_compiled(self, color):
+        """
+        Same verdict as 'has_insufficient_material' read off the compiled
+        material signature table. Black is assumed to have a single king.
+        """
+        if color == False:
+            return False
+        return MaterialSignatureTable.default()[MaterialSignatureTable.pack_board(self)]
+
+
+
+class TestRecord:
+    """
+    A generated test without the weight of a python-chess board.
+
+    It keeps the piece placement packed in its position key (see
+    WrappedBoard.position_key), the compositions of both sides, the verdict
+    and the name of its pattern. A WrappedBoard is only set up on demand with
+    'to_board'. The piece bitboards can still be read like on a
+    board, so WrappedBoard.has_insufficient_material works on a record too.
+    """
+    __slots__ = ("position", "white_composition", "black_composition", "is_insufficient", "name", "sufficient_subset")
+
+    def __init__(self, position, white_composition, black_composition, is_insufficient, name=None):
+        self.position = position
+        self.white_composition = white_composition
+        self.black_composition = black_composition
+        self.is_insufficient = is_insufficient
+        self.name = name
+        self.sufficient_subset = None
+
+    @classmethod
+    def from_board(cls, board, key=None):
+        """Needs the compositions of the board to be computed."""
+        record = cls(
+            board.position_key() if key is None else key,
+            board.white_composition,
+            board.black_composition,
+            board.is_insufficient,
+            board.comment
+            )
+        record.sufficient_subset = getattr(board, "sufficient_subset", None)
+        return record
+
+    def to_board(self):
+        return WrappedBoard.from_position_key(self.position, self.comment, self.is_insufficient)
+
+    @property
+    def comment(self):
+        return self.name
+
+    def position_key(self):
+        return self.position
+
+    def fen(self):
+        return self.to_board().fen()
+
+    @property
+    def pawns(self):
+        return self.position&~(self.position>>64)&~(self.position>>128)&0xffff_ffff_ffff_ffff
+
+    @property
+    def knights(self):
+        return (self.position>>64)&~self.position&~(self.position>>128)&0xffff_ffff_ffff_ffff
+
+    @property
+    def bishops(self):
+        return self.position&(self.position>>64)&~(self.position>>128)&0xffff_ffff_ffff_ffff
+
+    @property
+    def rooks(self):
+        return (self.position>>128)&~self.position&~(self.position>>64)&0xffff_ffff_ffff_ffff
+
+    @property
+    def queens(self):
+        return (self.position>>128)&self.position&~(self.position>>64)&0xffff_ffff_ffff_ffff
+
+    @property
+    def kings(self):
+        return (self.position>>128)&(self.position>>64)&~self.position&0xffff_ffff_ffff_ffff
+
+    @property
+    def occupied(self):
+        return (self.position|self.position>>64|self.position>>128)&0xffff_ffff_ffff_ffff
+
+    @property
+    def occupied_co(self):
+        black = (self.position>>192)&0xffff_ffff_ffff_ffff
+        return black, self.occupied&~black
+
+    has_insufficient_material = WrappedBoard.has_insufficient_material
+
+    def has_insufficient_material_compiled(self, color):
+        if color == False:
+            return False
+        return MaterialSignatureTable.default().is_insufficient(self.white_composition, self.black_composition)
+
+    SYMMETRIES = WrappedBoard.SYMMETRIES
+    symmetries = WrappedBoard.symmetries
+    canonical_key = WrappedBoard.canonical_key
+
+    def transform_symmetry(self, symmetry):
+        """Like WrappedBoard.transform_symmetry, straight on the position key."""
+        name, transform, swaps_colours = symmetry
+        return TestRecord(
+            WrappedBoard.transform_position_key(self.position, transform),
+            WrappedBoard.mirror_composition(self.white_composition) if swaps_colours else self.white_composition,
+            WrappedBoard.mirror_composition(self.black_composition) if swaps_colours else self.black_composition,
+            self.is_insufficient,
+            self.name
+            )
+
+    def mirror_vertical(self):
+        return self.transform_symmetry(self.SYMMETRIES[1])
+
+    def __le__(self, other):
+        """Is the material on 'self' a subset of the material on 'other'?"""
+        for i in range(7):
+            if self.white_composition[i] > other.white_composition[i]:
+                return False
+        for i in range(7):
+            if self.black_composition[i] > other.black_composition[i]:
+                return False
+        return True
+
+    def __ge__(self, other):
+        """Is the material on 'self' a superset of the material on 'other'?"""
+        return other <= self
+
+    def __str__(self):
+        return self.to_board().__str__()
+
+    def print(self):
+        self.to_board().print()
+
+
+
+class MaterialSignatureTable:
+    """
+    The verdicts of WrappedBoard.has_insufficient_material for every material signature.
+
+    The verdict only depends on the counts of the compositions, and none of the rules
+    looks further than three pieces of a kind (two for the white bishops of each colour).
+    So each count is clamped and packed in two bits; six for each side. The table keeps
+    one bit per packed signature and is compiled offline from the reference implementation.
+    """
+
+    path = join(dirname(abspath(__file__)), "horde_insufficient_material_table.bin")
+    header = b"HIMT1"
+    size = 1<<24
+
+    CLAMP2 = tuple(min(i,2) for i in range(65))
+    CLAMP3 = tuple(min(i,3) for i in range(65))
+
+    __default = None
+
+    def __init__(self, bits):
+        self.bits = bits
+
+    def __getitem__(self, key):
+        return (self.bits[key>>3]>>(key&7))&1 == 1
+
+    @classmethod
+    def pack(cls, white_composition, black_composition):
+        """Packs the compositions of WrappedBoard in a key of the table."""
+        c2, c3 = cls.CLAMP2, cls.CLAMP3
+        return (
+            c3[white_composition[0]] | c3[white_composition[2]]<<2 | c3[white_composition[3]]<<4 |
+            c3[white_composition[4]]<<6 | c2[white_composition[5]]<<8 | c2[white_composition[6]]<<10 |
+            c3[black_composition[0]]<<12 | c3[black_composition[2]]<<14 | c3[black_composition[3]]<<16 |
+            c3[black_composition[4]]<<18 | c3[black_composition[5]]<<20 | c3[black_composition[6]]<<22
+            )
+
+    @classmethod
+    def pack_board(cls, board):
+        """Packs the material of the board without computing its compositions."""
+        c2, c3 = cls.CLAMP2, cls.CLAMP3
+        white, black = board.occupied_co[1], board.occupied_co[0]
+        bishops = board.bishops
+        return (
+            c3[popcount(white&board.pawns)] | c3[popcount(white&board.knights)]<<2 |
+            c3[popcount(white&board.rooks)]<<4 | c3[popcount(white&board.queens)]<<6 |
+            c2[popcount(white&bishops&BB_DARK_SQUARES)]<<8 | c2[popcount(white&bishops&BB_LIGHT_SQUARES)]<<10 |
+            c3[popcount(black&board.pawns)]<<12 | c3[popcount(black&board.knights)]<<14 |
+            c3[popcount(black&board.rooks)]<<16 | c3[popcount(black&board.queens)]<<18 |
+            c3[popcount(black&bishops&BB_DARK_SQUARES)]<<20 | c3[popcount(black&bishops&BB_LIGHT_SQUARES)]<<22
+            )
+
+    def is_insufficient(self, white_composition, black_composition):
+        return self[self.pack(white_composition, black_composition)]
+
+    def is_insufficient_batch(self, occupied_white, occupied_black, pawns, knights, bishops, rooks, queens):
+        """
+        Assesses many positions at once; each argument is an array of uint64 bitboards
+        (e.g. board.occupied_co[True], board.pawns) and the i-th entries of the arrays
+        describe the i-th position. Returns an array of booleans.
+
+        Requires numpy.
+        """
+        import numpy as np
+
+        def popcount(bitboards):
+            try:
+                return np.bitwise_count(bitboards).astype(np.uint32)
+            except AttributeError:
+                # numpy<2.0
+                bitboards = bitboards - ((bitboards>>np.uint64(1))&np.uint64(0x5555555555555555))
+                bitboards = (bitboards&np.uint64(0x3333333333333333)) + ((bitboards>>np.uint64(2))&np.uint64(0x3333333333333333))
+                bitboards = (bitboards + (bitboards>>np.uint64(4)))&np.uint64(0x0f0f0f0f0f0f0f0f)
+                return ((bitboards*np.uint64(0x0101010101010101))>>np.uint64(56)).astype(np.uint32)
+
+        white = np.asarray(occupied_white, dtype=np.uint64)
+        black = np.asarray(occupied_black, dtype=np.uint64)
+        bishops = np.asarray(bishops, dtype=np.uint64)
+        dark, light = np.uint64(BB_DARK_SQUARES), np.uint64(BB_LIGHT_SQUARES)
+
+        keys = np.zeros(white.shape, dtype=np.uint32)
+        fields = [
+            (white, pawns, 3), (white, knights, 3), (white, rooks, 3), (white, queens, 3),
+            (white&dark, bishops, 2), (white&light, bishops, 2),
+            (black, pawns, 3), (black, knights, 3), (black, rooks, 3), (black, queens, 3),
+            (black&dark, bishops, 3), (black&light, bishops, 3)
+            ]
+        for n, (side, pieces, clamp) in enumerate(fields):
+            counts = np.minimum(popcount(side&np.asarray(pieces, dtype=np.uint64)), clamp)
+            keys |= counts<<np.uint32(2*n)
+
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        return ((bits[keys>>np.uint32(3)]>>(keys&np.uint32(7)).astype(np.uint8))&1).astype(bool)
+
+    @staticmethod
+    def board_from_key(key):
+        """Sets up a board with the material of the packed signature."""
+        board = WrappedBoard()
+        board.set_piece_at(A1, Piece(6,False))
+        # Nothing is placed on the backranks so that the pawns are never misplaced.
+        dark = list(SquareSet(BB_DARK_SQUARES&~BB_BACKRANKS))
+        light = list(SquareSet(BB_LIGHT_SQUARES&~BB_BACKRANKS))
+        for color, shift in [(True,0),(False,12)]:
+            counts = [(key>>(shift+2*i))&3 for i in range(6)]
+            for piece_type, count in zip([1,2,4,5],counts):
+                for _ in range(count):
+                    sq = dark.pop() if len(dark)>len(light) else light.pop()
+                    board.set_piece_at(sq, Piece(piece_type,color))
+            for _ in range(counts[4]):
+                board.set_piece_at(dark.pop(), Piece(3,color))
+            for _ in range(counts[5]):
+                board.set_piece_at(light.pop(), Piece(3,color))
+        return board
+
+    @classmethod
+    def compile(cls):
+        """
+        Assesses every packed signature with WrappedBoard.has_insufficient_material.
+
+        Signatures in which white has four or more pieces are decided before
+        black's material is looked at, so only one board is assessed for each
+        of those white signatures.
+        """
+        bits = bytearray(cls.size>>3)
+        for white_key in range(1<<12):
+            counts = [(white_key>>(2*i))&3 for i in range(6)]
+            if counts[4] == 3 or counts[5] == 3:
+                continue
+            black_keys = range(1<<12) if sum(counts) <= 3 else [0]
+            for black_key in black_keys:
+                key = white_key | black_key<<12
+                if cls.board_from_key(key).has_insufficient_material(True):
+                    bits[key>>3] |= 1<<(key&7)
+            if sum(counts) > 3 and bits[white_key>>3]>>(white_key&7)&1:
+                raise Exception("Four or more white pieces are expected to be sufficient material")
+        return cls(bytes(bits))
+
+    def save(self, path=None):
+        with open(path or self.path, "wb") as file:
+            file.write(self.header + compress(self.bits, 9))
+
+    @classmethod
+    def load(cls, path=None):
+        with open(path or cls.path, "rb") as file:
+            data = file.read()
+        if not data.startswith(cls.header):
+            raise ValueError("Not a material signature table: "+str(path or cls.path))
+        return cls(decompress(data[len(cls.header):]))
+
+    @classmethod
+    def default(cls):
+        """The table next to the module; compile_insufficient_material_table.py writes it."""
+        if cls.__default is None:
+            if not exists(cls.path):
+                raise FileNotFoundError(
+                    "The material signature table is missing at '"+cls.path+"'; "
+                    "run compile_insufficient_material_table.py to compile it."
+                    )
+            cls.__default = cls.load()
+        return cls.__default
+
 
     
+class TrackedBoard(WrappedBoard):
+    """
+    A WrappedBoard for live games that answers has_insufficient_material after every
+    move without assessing the material all over again.
+
+    The counts of the packed material signature (see MaterialSignatureTable.pack) are
+    kept up to date as moves are pushed and popped; only captures and promotions change
+    them. The verdict is only assessed again when the signature changes, so on quiet
+    moves and on pop the last verdict is returned. The rest of the ways to change the
+    board, e.g. set_piece_at or set_fen, count the material from scratch.
+    """
+
+    # The fields of the signature; the white pawns, knights, rooks, queens, dark and
+    # light square bishops, followed by the black ones.
+    FIELDS = {1: 0, 2: 1, 4: 2, 5: 3}
+    CLAMPS = (MaterialSignatureTable.CLAMP3,)*4 + (MaterialSignatureTable.CLAMP2,)*2 + (MaterialSignatureTable.CLAMP3,)*6
+
+    def __init__(self, fen="8/8/8/8/8/8/8/8 b - - 0 1", name="", is_insufficient=True):
+        super().__init__(fen, name, is_insufficient)
+        self.track_material()
+
+    @classmethod
+    def from_position_key(cls, key, name="", is_insufficient=True):
+        board = super().from_position_key(key, name, is_insufficient)
+        board.track_material()
+        return board
+
+    def track_material(self):
+        """
+        Counts the material from scratch. The moves that are already on the stack
+        get the material counted from scratch again when they are popped.
+        """
+        bishops = self.bishops
+        self.material = [
+            popcount(side&pieces)
+            for side in (self.occupied_co[1], self.occupied_co[0])
+            for pieces in (self.pawns, self.knights, self.rooks, self.queens, bishops&BB_DARK_SQUARES, bishops&BB_LIGHT_SQUARES)
+            ]
+        self.material_signature = self.__signature()
+        self.material_verdict = None
+        self.material_stack = [True]*len(self.move_stack)
+
+    def __signature(self):
+        signature = 0
+        for n, (clamp, count) in enumerate(zip(self.CLAMPS, self.material)):
+            signature |= clamp[count]<<(2*n)
+        return signature
+
+    def __field(self, piece_type, color, square):
+        """The field of the signature of a piece; None for the kings."""
+        if piece_type == 3:
+            field = 4 if BB_SQUARES[square]&BB_DARK_SQUARES else 5
+        elif piece_type in self.FIELDS:
+            field = self.FIELDS[piece_type]
+        else:
+            return None
+        return field if color else field+6
+
+    def push(self, move):
+        changes = []
+        if move:
+            if self.is_en_passant(move):
+                changes.append( self.__field(1, not self.turn, move.to_square) )
+            elif self.occupied_co[not self.turn] & BB_SQUARES[move.to_square]:
+                # A castling move of chess960 lands on a piece of the side to move instead.
+                changes.append( self.__field(self.piece_type_at(move.to_square), not self.turn, move.to_square) )
+            if move.promotion:
+                changes.append( self.__field(1, self.turn, move.from_square) )
+                changes.append( -1-self.__field(move.promotion, self.turn, move.to_square) )
+        changes = [ field for field in changes if field is not None ]
+
+        if changes:
+            # A field n is decremented and a field -1-n is incremented.
+            self.material_stack.append( (changes, self.material_signature, self.material_verdict) )
+            for field in changes:
+                if field >= 0:
+                    self.material[field] -= 1
+                else:
+                    self.material[-1-field] += 1
+            signature = self.__signature()
+            if signature != self.material_signature:
+                self.material_signature = signature
+                self.material_verdict = None
+        else:
+            self.material_stack.append(None)
+        super().push(move)
+
+    def pop(self):
+        move = super().pop()
+        entry = self.material_stack.pop()
+        if entry is True:
+            self.track_material()
+        elif entry is not None:
+            changes, self.material_signature, self.material_verdict = entry
+            for field in changes:
+                if field >= 0:
+                    self.material[field] += 1
+                else:
+                    self.material[-1-field] -= 1
+        return move
+
+    def has_insufficient_material(self, color):
+        if color == False:
+            return False
+        if self.material_verdict is None:
+            self.material_verdict = super().has_insufficient_material(color)
+        return self.material_verdict
+
+    def copy(self, *, stack=True):
+        board = super().copy(stack=stack)
+        board.material = list(self.material)
+        board.material_signature = self.material_signature
+        board.material_verdict = self.material_verdict
+        board.material_stack = self.material_stack[len(self.material_stack)-len(board.move_stack):]
+        return board
+
+    def set_piece_at(self, square, piece, promoted=False):
+        super().set_piece_at(square, piece, promoted)
+        self.track_material()
+
+    def remove_piece_at(self, square):
+        piece = super().remove_piece_at(square)
+        self.track_material()
+        return piece
+
+    def set_fen(self, fen):
+        super().set_fen(fen)
+        self.track_material()
+
+    def set_board_fen(self, fen):
+        super().set_board_fen(fen)
+        self.track_material()
+
+    def set_piece_map(self, pieces):
+        super().set_piece_map(pieces)
+        self.track_material()
+
+    def set_chess960_pos(self, scharnagl):
+        super().set_chess960_pos(scharnagl)
+        self.track_material()
+
+    def clear_board(self):
+        super().clear_board()
+        self.track_material()
+
+    def reset_board(self):
+        super().reset_board()
+        self.track_material()
+
+    def apply_transform(self, f):
+        super().apply_transform(f)
+        self.track_material()
+
+
+
+class DominanceIndex:
+    def __init__(self, dimensions):
+        """
+        An index of tuples for finding the ones that are coordinatewise below some bounds.
+
+        For every coordinate and every value v it keeps the bitset of the entries whose
+        coordinate is exactly v, so that adding an entry sets one bit per coordinate. A
+        query ORs the bitsets of the values within its bound for each coordinate and
+        intersects them, and only the entries that survive the intersection are looked
+        at; the queries from below take the values at or above their bound instead.
+        The slot and key of every entry are kept by the entry so that 'remove' only
+        clears its own bits. Once half of the slots are removed, the live entries get
+        indexed again in their order.
+        """
+        self.dimensions = dimensions
+        self.entries = []
+        self.keys = []
+        self.slots = dict()
+        self.all = 0
+        self.exactly = [[] for _ in range(dimensions)]
+        self.removed = 0
+
+    def __len__(self):
+        return len(self.entries) - self.removed
+
+    def add(self, key, entry):
+        """Indexes 'entry' under 'key', a tuple of non-negative integers."""
+        slot = len(self.entries)
+        bit = 1<<slot
+        for exactly, value in zip(self.exactly, key):
+            if value >= len(exactly):
+                exactly.extend( [0]*(value+1-len(exactly)) )
+            exactly[value] |= bit
+        self.entries.append(entry)
+        self.keys.append(key)
+        self.slots.setdefault(entry, []).append(slot)
+        self.all |= bit
+
+    def remove(self, entry):
+        """Removes every occurrence of 'entry' from the results of the queries."""
+        for slot in self.slots.pop(entry, []):
+            bit = 1<<slot
+            for exactly, value in zip(self.exactly, self.keys[slot]):
+                exactly[value] &= ~bit
+            self.entries[slot] = None
+            self.keys[slot] = None
+            self.all &= ~bit
+            self.removed += 1
+        if self.removed > len(self.entries)//2:
+            self.__compact()
+
+    def __compact(self):
+        live = [ (key, entry) for key, entry in zip(self.keys, self.entries) if entry is not None ]
+        self.__init__(self.dimensions)
+        for key, entry in live:
+            self.add(key, entry)
+
+    def candidates(self, bounds):
+        """Yields the entries whose keys are coordinatewise at most 'bounds' in insertion order."""
+        mask = self.all
+        for exactly, bound in zip(self.exactly, bounds):
+            if bound < 0:
+                return
+            if bound+1 < len(exactly):
+                below = 0
+                for bitset in exactly[:bound+1]:
+                    below |= bitset
+                mask &= below
+                if not mask:
+                    return
+        yield from self.__entries_of(mask)
+
+    def candidates_above(self, bounds):
+        """Yields the entries whose keys are coordinatewise at least 'bounds' in insertion order."""
+        mask = self.all
+        for exactly, bound in zip(self.exactly, bounds):
+            if bound >= len(exactly):
+                return
+            if bound > 0:
+                above = 0
+                for bitset in exactly[bound:]:
+                    above |= bitset
+                mask &= above
+                if not mask:
+                    return
+        yield from self.__entries_of(mask)
+
+    def __entries_of(self, mask):
+        entries = self.entries
+        while mask:
+            lowest = mask&-mask
+            yield entries[lowest.bit_length()-1]
+            mask ^= lowest
+
+
+
 class MaterialCompositions:
     def __init__(self):
-        """A dictionary to keep the material compositions."""
+        """
+        A dictionary to keep the material compositions.
+        The version goes up every time a composition gets added.
+        """
         self.material = dict()
         self.boards = dict()
+        self.index = DominanceIndex(12)
+        self.version = 0
 
     @staticmethod
     def __is_tuple1_subset_tuple2(tuple1, tuple2):
@@ -323,9 +993,17 @@ class MaterialCompositions:
         return True
 
     @staticmethod
-    def __mirror(tuple):
-        return tuple[0],tuple[1],tuple[2],tuple[3],tuple[4],tuple[6],tuple[5]
-    
+    def __index_key(white_comp, black_comp):
+        # The total number of bishops is implied by the dark and light ones.
+        return white_comp[:1]+white_comp[2:]+black_comp[:1]+black_comp[2:]
+
+    def __insert(self, white_comp, black_comp, board):
+        compositions = self.material.setdefault(white_comp,set())
+        if black_comp not in compositions:
+            compositions.add(black_comp)
+            self.index.add( self.__index_key(white_comp, black_comp), (white_comp, black_comp) )
+            self.version += 1
+        self.boards.setdefault( white_comp, dict() )[black_comp] = board
 
     def add(self, board):
         """
@@ -341,13 +1019,36 @@ class MaterialCompositions:
             if self.__is_tuple1_subset_tuple2(cand_black_comp,black_comp):
                 return None
         else:
-            self.material[white_comp].add(black_comp)
-            self.boards.setdefault( white_comp, dict() )[black_comp] = board
+            self.__insert(white_comp, black_comp, board)
 
             if board.bishops:
-                self.material.setdefault( self.__mirror(white_comp), set() ).add( self.__mirror(black_comp) )
-                self.boards.setdefault( self.__mirror(white_comp), dict() )[self.__mirror(black_comp)] = board.mirror_vertical()
+                self.__insert( WrappedBoard.mirror_composition(white_comp), WrappedBoard.mirror_composition(black_comp), board.mirror_vertical() )
+
+
+    def entries(self):
+        """Yields (white composition, black composition, board) for every composition."""
+        for white_comp in self.material:
+            for black_comp in self.material[white_comp]:
+                yield white_comp, black_comp, self.boards.get(white_comp, dict()).get(black_comp)
+
+    def merge(self, entries):
+        """
+        Merges compositions, e.g. the entries of another MaterialCompositions, in 'self'.
 
+        Both collections are antichains for each white composition and so is their union
+        once the compositions that have a subset in the other collection are dropped.
+        An incoming composition is skipped if it has a subset in 'self' and otherwise it
+        replaces the compositions of 'self' that it is a subset of.
+        """
+        for white_comp, black_comp, board in entries:
+            compositions = self.material.setdefault(white_comp,set())
+            if any( self.__is_tuple1_subset_tuple2(cand_black_comp,black_comp) for cand_black_comp in compositions ):
+                continue
+            for cand_black_comp in [ cand for cand in compositions if self.__is_tuple1_subset_tuple2(black_comp,cand) ]:
+                compositions.remove(cand_black_comp)
+                self.boards[white_comp].pop(cand_black_comp, None)
+                self.index.remove( (white_comp,cand_black_comp) )
+            self.__insert(white_comp, black_comp, board)
 
     def  __len__(self):
         return sum( [ 1 for i in self.material for j in self.material[i]] )
@@ -355,6 +1056,34 @@ class MaterialCompositions:
     def __getitem__(self, i):
         return self.material[i]
 
+    def find_subset_of(self, white_composition, black_composition):
+        """
+        Returns a pair of compositions in 'self' that is a subset of the given
+        compositions, once enough black pawns get promoted, or None.
+
+        A white composition of the index has to be a subset of 'white_composition'.
+        A black composition needs to have at most as many pawns as 'black_composition'
+        and every other piece it has in excess has to come from a promoted pawn,
+        so none of its coordinates exceeds the one of 'black_composition' by more
+        than the number of black pawns. Only the candidates within those bounds are
+        checked.
+        """
+        pawns = black_composition[0]
+        bounds = (
+            white_composition[:1]+white_composition[2:]+(pawns,)+
+            tuple(black_composition[j]+pawns for j in range(2,7))
+            )
+        for white_comp, black_comp in self.index.candidates(bounds):
+            residual_pawns = pawns - black_comp[0]
+            for j in range(2,7):
+                if black_comp[j] > black_composition[j]:
+                    residual_pawns += black_composition[j] - black_comp[j]
+                    if residual_pawns < 0:
+                        break
+            else:
+                return white_comp, black_comp
+        return None
+
     def exists_subset_of(self, board):
         """
         Returns True if the material composition of 'board' has a subset
@@ -367,61 +1096,730 @@ class MaterialCompositions:
         except AttributeError:
             pass
 
-        for white_comp in self.material:
-            if self.__is_tuple1_subset_tuple2(white_comp, board.white_composition):
+        board.sufficient_subset = self.find_subset_of(board.white_composition, board.black_composition)
+        if board.sufficient_subset is None:
+            return False
 
-                if board.black_composition in self.material[white_comp]:
-                    board.sufficient_subset = (white_comp,board.black_composition)
-                    return True
+        return True
 
-                for black_comp in self.material[white_comp]:
-                    if black_comp[0] > board.black_composition[0]:
-                        continue
-                    residual_pawns =  board.black_composition[0] - black_comp[0]
-                    for j in range(2,7):
-                        if black_comp[j] > board.black_composition[j]:
-                            residual_pawns += board.black_composition[j] - black_comp[j]
-                            if residual_pawns < 0:
-                                break
-                    else:
-                        board.sufficient_subset = (white_comp,black_comp)
-                        self.boards.setdefault(board.white_composition,dict())[board.black_composition] = self.boards[white_comp][black_comp]
-                        return True
 
-        board.sufficient_subset = None
-        return False
 
+class CompositionIndex:
+    def __init__(self):
+        """
+        An index of tests by the material compositions of both sides.
 
+        The tests are grouped by their pair of compositions and the pairs are kept in
+        a DominanceIndex, so a query only looks at the groups within its bounds.
+        """
+        self.groups = dict()
+        self.index = DominanceIndex(12)
 
-class GenerateTestsFromPatterns:
+    @staticmethod
+    def __key(white_comp, black_comp):
+        # The total number of bishops is implied by the dark and light ones.
+        return white_comp[:1]+white_comp[2:]+black_comp[:1]+black_comp[2:]
+
+    def add(self, test):
+        """Indexes a test with computed compositions."""
+        composition = (test.white_composition, test.black_composition)
+        if composition not in self.groups:
+            self.groups[composition] = []
+            self.index.add( self.__key(*composition), composition )
+        self.groups[composition].append(test)
+
+    def __len__(self):
+        return sum( len(tests) for tests in self.groups.values() )
+
+    def subsets_of(self, white_comp, black_comp):
+        """Yields the tests whose material is a subset of the given compositions."""
+        for composition in self.index.candidates( self.__key(white_comp, black_comp) ):
+            yield from self.groups[composition]
+
+    def supersets_of(self, white_comp, black_comp):
+        """Yields the tests whose material is a superset of the given compositions."""
+        for composition in self.index.candidates_above( self.__key(white_comp, black_comp) ):
+            yield from self.groups[composition]
+
+    def exactly(self, white_comp, black_comp):
+        """Yields the tests with exactly the given compositions."""
+        yield from self.groups.get( (white_comp, black_comp), [] )
+
+
+
+class MemoryTestStore:
     def __init__(self):
-        """Use add_pattern to add patterns."""
+        """
+        Keeps the tests of a GenerateTestsFromPatterns in memory; the default store.
+
+        The tests are kept by the name of their pattern, in the order they were added,
+        along with their position keys for the dedupe and a CompositionIndex. The
+        tests that correct_contradictions has yet to check are 'unchecked' and the
+        checked ones that are still insufficient are grouped by their compositions.
+        """
         self.tests = dict()
+        self.positions = set()
+        self.compositions = CompositionIndex()
+        self.unchecked = []
+        self.insufficient_groups = dict()
+
+    def add_name(self, name):
+        self.tests.setdefault(name, [])
+
+    def add(self, test):
+        """Stores a new test as unchecked."""
+        self.tests.setdefault(test.comment, []).append(test)
+        self.positions.add(test.position)
+        self.compositions.add(test)
+        self.unchecked.append(test)
+
+    def update(self, tests):
+        """Writes back the changes to the verdicts and subsets of stored tests."""
+        # Nothing to do; the stored tests are the objects that got changed.
+        pass
+
+    def commit(self):
+        # Nothing to do; there is nothing to write out.
+        pass
+
+    def __contains__(self, position):
+        return position in self.positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        for name in self.tests:
+            yield from self.tests[name]
+
+    def __getitem__(self, name):
+        return self.tests[name]
+
+    def __repr__(self):
+        return self.tests.__repr__()
+
+    def names(self):
+        return list(self.tests)
+
+    def count(self, name):
+        return len(self.tests[name])
+
+    def sample(self, name, limit):
+        from random import sample
+        return sample(self.tests[name], limit)
+
+    def batches(self):
+        """Yields all the tests in lists."""
+        yield list(self)
+
+    def subsets_of(self, white_comp, black_comp):
+        return self.compositions.subsets_of(white_comp, black_comp)
+
+    def supersets_of(self, white_comp, black_comp):
+        return self.compositions.supersets_of(white_comp, black_comp)
+
+    def exactly(self, white_comp, black_comp):
+        return self.compositions.exactly(white_comp, black_comp)
+
+    def insufficient_compositions(self):
+        """The compositions of the checked tests that are still insufficient."""
+        return list(self.insufficient_groups)
+
+    def make_sufficient(self, composition, sufficient_subset):
+        """Marks the checked insufficient tests of a composition as sufficient and unchecked."""
+        for test in self.insufficient_groups.pop(composition):
+            test.is_insufficient = False
+            test.sufficient_subset = sufficient_subset
+            self.unchecked.append(test)
+
+    def unchecked_batches(self):
+        """Yields the unchecked tests in lists; see checked."""
+        unchecked, self.unchecked = self.unchecked, []
+        yield unchecked
+
+    def checked(self, tests, failures):
+        """
+        Records the outcome of the check of a batch of unchecked_batches; the 'failures'
+        stay unchecked and the rest of the insufficient tests get grouped.
+        """
+        failed = set( id(test) for test in failures )
+        for test in tests:
+            if id(test) in failed:
+                self.unchecked.append(test)
+            elif test.is_insufficient:
+                self.insufficient_groups.setdefault( (test.white_composition, test.black_composition), [] ).append(test)
+
+
+
+class SQLiteTestStore:
+    def __init__(self, path, batch_size=10000):
+        """
+        Keeps the tests of a GenerateTestsFromPatterns in an sqlite3 database at 'path',
+        for the runs whose tests do not fit in memory. An existing database is reopened.
+
+        The tests are indexed by their position key, their pair of compositions and the
+        name of their pattern. They are inserted in batches of 'batch_size' and read in
+        pages of that size, so only the pairs of compositions and the pattern names stay
+        in memory. The changes are committed by 'commit', e.g. with every checkpoint of
+        the generator; a run that gets cut off leaves the tests of its last checkpoint.
+        """
+        from sqlite3 import connect
+        self.path = path
+        self.batch_size = batch_size
+        self.connection = connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS names (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+            CREATE TABLE IF NOT EXISTS compositions (id INTEGER PRIMARY KEY, composition BLOB UNIQUE);
+            CREATE TABLE IF NOT EXISTS tests (
+                id INTEGER PRIMARY KEY,
+                position BLOB UNIQUE,
+                name INTEGER,
+                white INTEGER,
+                black INTEGER,
+                is_insufficient INTEGER,
+                unchecked INTEGER,
+                subset_white INTEGER,
+                subset_black INTEGER
+                );
+            CREATE INDEX IF NOT EXISTS tests_by_name ON tests (name);
+            CREATE INDEX IF NOT EXISTS tests_by_composition ON tests (white, black, is_insufficient, unchecked);
+            CREATE INDEX IF NOT EXISTS unchecked_tests ON tests (id) WHERE unchecked;
+            """)
+        self.name_ids = dict()
+        self.names_of = dict()
+        for name_id, name in self.connection.execute("SELECT id, name FROM names ORDER BY id"):
+            self.name_ids[name] = name_id
+            self.names_of[name_id] = name
+        self.composition_ids = dict()
+        self.compositions = dict()
+        for composition_id, composition in self.connection.execute("SELECT id, composition FROM compositions"):
+            self.composition_ids[tuple(composition)] = composition_id
+            self.compositions[composition_id] = tuple(composition)
+        self.pairs = set()
+        self.index = DominanceIndex(12)
+        for white, black in self.connection.execute("SELECT DISTINCT white, black FROM tests"):
+            self.__index( (self.compositions[white], self.compositions[black]) )
+        self.size = self.connection.execute("SELECT COUNT(*) FROM tests").fetchone()[0]
+        self.pending = dict()
+
+    @staticmethod
+    def __key(white_comp, black_comp):
+        # Like CompositionIndex.__key
+        return white_comp[:1]+white_comp[2:]+black_comp[:1]+black_comp[2:]
+
+    def __index(self, composition):
+        if composition not in self.pairs:
+            self.pairs.add(composition)
+            self.index.add( self.__key(*composition), composition )
+
+    def __name_id(self, name):
+        if name not in self.name_ids:
+            self.name_ids[name] = self.connection.execute("INSERT INTO names (name) VALUES (?)", (name,)).lastrowid
+            self.names_of[self.name_ids[name]] = name
+        return self.name_ids[name]
+
+    def __composition_id(self, composition):
+        if composition is None:
+            return None
+        if composition not in self.composition_ids:
+            self.composition_ids[composition] = self.connection.execute("INSERT INTO compositions (composition) VALUES (?)", (bytes(composition),)).lastrowid
+            self.compositions[self.composition_ids[composition]] = composition
+        return self.composition_ids[composition]
+
+    @staticmethod
+    def __position(position):
+        return position.to_bytes((position.bit_length()+7)//8, "little")
+
+    def __subset(self, test):
+        white_comp, black_comp = test.sufficient_subset or (None, None)
+        return self.__composition_id(white_comp), self.__composition_id(black_comp)
+
+    def __record(self, row):
+        position, name, white, black, is_insufficient, subset_white, subset_black = row
+        test = TestRecord(int.from_bytes(position, "little"), self.compositions[white], self.compositions[black], bool(is_insufficient), self.names_of[name])
+        if subset_white is not None:
+            test.sufficient_subset = (self.compositions[subset_white], self.compositions[subset_black])
+        return test
+
+    def __select(self, condition="1", parameters=()):
+        """Yields the tests that meet an sql 'condition' in the order they were added, a page at a time."""
+        self.flush()
+        last = 0
+        while True:
+            rows = self.connection.execute(
+                "SELECT id, position, name, white, black, is_insufficient, subset_white, subset_black FROM tests"
+                " WHERE id > ? AND ("+condition+") ORDER BY id LIMIT ?",
+                (last,)+tuple(parameters)+(self.batch_size,)
+                ).fetchall()
+            if not rows:
+                return None
+            last = rows[-1][0]
+            yield [ self.__record(row[1:]) for row in rows ]
+
+    def add_name(self, name):
+        self.__name_id(name)
+
+    def add(self, test):
+        """Stores a new test as unchecked; it gets inserted with the next batch."""
+        self.pending[test.position] = test
+        self.__index( (test.white_composition, test.black_composition) )
+        self.size += 1
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Inserts the pending tests; the ones whose position is already stored are left out."""
+        if not self.pending:
+            return None
+        inserted = self.connection.executemany(
+            "INSERT OR IGNORE INTO tests (position, name, white, black, is_insufficient, unchecked, subset_white, subset_black) VALUES (?,?,?,?,?,1,?,?)",
+            [
+                (self.__position(test.position), self.__name_id(test.comment),
+                 self.__composition_id(test.white_composition), self.__composition_id(test.black_composition),
+                 test.is_insufficient)+self.__subset(test)
+                for test in self.pending.values()
+                ]
+            ).rowcount
+        self.size -= len(self.pending) - inserted
+        self.pending = dict()
+
+    def update(self, tests, unchecked=None):
+        """
+        Writes back the changes to the verdicts and subsets of stored tests.
+        The tests in 'unchecked', a set of ids, are marked as unchecked and the rest as checked.
+        """
+        self.flush()
+        self.connection.executemany(
+            "UPDATE tests SET is_insufficient=?, subset_white=?, subset_black=?"+("" if unchecked is None else ", unchecked=?")+" WHERE position=?",
+            [
+                (test.is_insufficient,)+self.__subset(test)+
+                (() if unchecked is None else (id(test) in unchecked,))+(self.__position(test.position),)
+                for test in tests
+                ]
+            )
+
+    def commit(self):
+        self.flush()
+        self.connection.commit()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __contains__(self, position):
+        """
+        The pending tests are looked up first, then the database by the unique index on the
+        position; sqlite3 keeps the statement prepared, so the lookup is a single index probe.
+        """
+        if position in self.pending:
+            return True
+        return self.connection.execute("SELECT 1 FROM tests WHERE position=?", (self.__position(position),)).fetchone() is not None
+
+    def __len__(self):
+        self.flush()
+        return self.size
+
+    def __iter__(self):
+        for name in self.names():
+            yield from self[name]
+
+    def __getitem__(self, name):
+        if name not in self.name_ids:
+            return None
+        for tests in self.__select("name=?", (self.name_ids[name],)):
+            yield from tests
+
+    def __repr__(self):
+        return "SQLiteTestStore("+repr(self.path)+")"
+
+    def names(self):
+        return list(self.name_ids)
+
+    def count(self, name):
+        if name not in self.name_ids:
+            return 0
+        self.flush()
+        return self.connection.execute("SELECT COUNT(*) FROM tests WHERE name=?", (self.name_ids[name],)).fetchone()[0]
+
+    def sample(self, name, limit):
+        """Like random.sample on the tests of a pattern; only the sample is kept in memory."""
+        from random import sample
+        picked = set(sample(range(self.count(name)), limit))
+        return [ test for n, test in enumerate(self[name]) if n in picked ]
+
+    def batches(self):
+        """Yields all the tests in lists of at most 'batch_size' tests."""
+        for name in self.names():
+            yield from self.__select("name=?", (self.name_ids[name],))
+
+    def __group(self, composition):
+        white_comp, black_comp = composition
+        if white_comp not in self.composition_ids or black_comp not in self.composition_ids:
+            return None
+        for tests in self.__select("white=? AND black=?", (self.composition_ids[white_comp], self.composition_ids[black_comp])):
+            yield from tests
+
+    def subsets_of(self, white_comp, black_comp):
+        for composition in self.index.candidates( self.__key(white_comp, black_comp) ):
+            yield from self.__group(composition)
+
+    def supersets_of(self, white_comp, black_comp):
+        for composition in self.index.candidates_above( self.__key(white_comp, black_comp) ):
+            yield from self.__group(composition)
+
+    def exactly(self, white_comp, black_comp):
+        yield from self.__group( (white_comp, black_comp) )
+
+    def insufficient_compositions(self):
+        self.flush()
+        return [
+            (self.compositions[white], self.compositions[black])
+            for white, black in self.connection.execute("SELECT DISTINCT white, black FROM tests WHERE is_insufficient AND NOT unchecked").fetchall()
+            ]
+
+    def make_sufficient(self, composition, sufficient_subset):
+        self.flush()
+        self.connection.execute(
+            "UPDATE tests SET is_insufficient=0, unchecked=1, subset_white=?, subset_black=? WHERE white=? AND black=? AND is_insufficient AND NOT unchecked",
+            ( self.__composition_id(sufficient_subset[0]), self.__composition_id(sufficient_subset[1]) )+
+            tuple( self.__composition_id(comp) for comp in composition )
+            )
+
+    def unchecked_batches(self):
+        """
+        Yields the unchecked tests in lists of at most 'batch_size' tests; see checked.
+        The ones that stay unchecked are not yielded again.
+        """
+        yield from self.__select("unchecked")
+
+    def checked(self, tests, failures):
+        self.update(tests, set( id(test) for test in failures ))
+
+
+
+class AttackTables:
+    """
+    The squares that a piece attacks from every square of an empty board and the
+    squares strictly between every two squares on a common line. They answer
+    whether a black piece can stop a check with a few bitwise operations instead
+    of generating the legal moves of a board.
+    """
+
+    DIRECTIONS = {
+        2: [(1,2),(2,1),(2,-1),(1,-2),(-1,-2),(-2,-1),(-2,1),(-1,2)],
+        3: [(1,1),(1,-1),(-1,-1),(-1,1)],
+        4: [(1,0),(0,1),(-1,0),(0,-1)],
+        }
+
+    def __init__(self):
+        self.attacks = dict()
+        self.between = [[0]*64 for _ in range(64)]
+        for piece_type, directions in self.DIRECTIONS.items():
+            self.attacks[piece_type] = [0]*64
+            for sq in range(64):
+                for file_step, rank_step in directions:
+                    file, rank, ray = square_file(sq)+file_step, square_rank(sq)+rank_step, 0
+                    while 0 <= file < 8 and 0 <= rank < 8:
+                        target = square(file, rank)
+                        self.attacks[piece_type][sq] |= BB_SQUARES[target]
+                        if piece_type == 2:
+                            break
+                        self.between[sq][target] = ray
+                        ray |= BB_SQUARES[target]
+                        file, rank = file+file_step, rank+rank_step
+        self.attacks[5] = [ bishop|rook for bishop, rook in zip(self.attacks[3], self.attacks[4]) ]
+
+    def reaches(self, piece_type, from_square, targets, occupied):
+        """The 'targets' that a non-pawn piece on 'from_square' attacks on a board with the 'occupied' squares."""
+        reached = 0
+        for target in SquareSet(targets & self.attacks[piece_type][from_square]):
+            if piece_type == 2 or self.between[from_square][target] & occupied == 0:
+                reached |= BB_SQUARES[target]
+        return reached
+
+    def black_pawn_reaches(self, from_square, targets, occupied, white):
+        """The 'targets' that a black pawn on 'from_square' can move to."""
+        reached = 0
+        file, rank = square_file(from_square), square_rank(from_square)
+        if rank == 0:
+            return 0
+        push = BB_SQUARES[from_square-8]
+        if push & occupied == 0:
+            reached |= push
+            if rank == 6 and BB_SQUARES[from_square-16] & occupied == 0:
+                reached |= BB_SQUARES[from_square-16]
+        for file_step in [-1,1]:
+            if 0 <= file+file_step < 8:
+                reached |= BB_SQUARES[square(file+file_step, rank-1)] & white
+        return reached & targets
+
+    def pins(self, king, sliders, occupied):
+        """
+        Returns a dict from the squares of the pinned pieces to the squares they
+        can still move to, for the white 'sliders'=list of (square, piece type).
+        """
+        pinned = dict()
+        for sq, piece_type in sliders:
+            if not self.attacks[piece_type][king] & BB_SQUARES[sq]:
+                continue
+            blockers = self.between[king][sq] & occupied
+            if blockers and blockers & (blockers-1) == 0:
+                pinned[msb(blockers)] = self.between[king][sq] | BB_SQUARES[sq]
+        return pinned
+
+    __default = None
+
+    @classmethod
+    def default(cls):
+        if cls.__default is None:
+            cls.__default = cls()
+        return cls.__default
+
+
+
+class WhiteConfigurationCache:
+    """
+    The white configurations of GenerateTestsFromPatterns.generate_patterns as lists
+    of position keys, keyed on (king square, white side). Past 'max_size' entries,
+    the least recently used ones are dropped. It can be saved and loaded to reuse
+    the configurations between runs; the file holds nothing but the squares, the
+    white sides and the position keys, so a cache from elsewhere is safe to load.
+    """
+
+    header = b"HIWC2"
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, king, white_side):
+        key = (king, tuple(white_side))
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, king, white_side, position_keys):
+        self.entries[(king, tuple(white_side))] = position_keys
+        self.entries.move_to_end((king, tuple(white_side)))
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def save(self, path):
+        entries = [ [king, "".join(white_side), position_keys] for (king, white_side), position_keys in self.entries.items() ]
+        with open(path, "wb") as file:
+            file.write(self.header + compress(dumps_json(entries).encode(), 9))
+
+    @classmethod
+    def load(cls, path, max_size=4096):
+        with open(path, "rb") as file:
+            data = file.read()
+        if not data.startswith(cls.header):
+            raise ValueError("Not a white configuration cache: "+str(path))
+        cache = cls(max_size)
+        for king, white_side, position_keys in loads_json(decompress(data[len(cls.header):]).decode()):
+            cache.put(int(king), tuple(white_side), [ int(key) for key in position_keys ])
+        return cache
+
+
+
+class RunProfile:
+    """
+    The instrumentation of a run of GenerateTestsFromPatterns; the time spent in each
+    of its phases, the counters of the hot paths and, optionally, a cProfile capture.
+    They are written in a JSON run manifest by write_manifest.
+
+    The counters are kept by the generator in its own loops, so the boards and the
+    classifier carry no instrumentation. The work done in worker processes is timed
+    with the phase that started them but it is not counted.
+    """
+
+    def __init__(self, profile=False):
+        self.started = time()
+        self.counters = Counter()
+        self.phases = dict()
+        self.running = set()
+        self.profiler = None
+        if profile:
+            from cProfile import Profile
+            self.profiler = Profile()
+            self.profiler.enable()
+
+    @staticmethod
+    def timed(method):
+        """
+        Times the calls of a method of GenerateTestsFromPatterns as the phase of the same name.
+        The time of a phase includes the phases it calls, e.g. export_to includes correct_contradictions,
+        and the calls it makes to itself are not timed again.
+        """
+        @wraps(method)
+        def timed_method(self, *args, **kwargs):
+            phase = method.__name__
+            if phase in self.profile.running:
+                return method(self, *args, **kwargs)
+            self.profile.running.add(phase)
+            start = time()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.profile.running.discard(phase)
+                self.profile.add_time(phase, time()-start)
+        return timed_method
+
+    def add_time(self, phase, seconds):
+        timer = self.phases.setdefault(phase, {"calls": 0, "seconds": 0.0})
+        timer["calls"] += 1
+        timer["seconds"] += seconds
+
+    def counts(self):
+        return dict(self.counters)
+
+    def hot_functions(self, top=30):
+        """The 'top' functions of the cProfile capture by cumulative time."""
+        from pstats import Stats
+        self.profiler.disable()
+        stats = Stats(self.profiler).stats
+        self.profiler.enable()
+        return [
+            {
+                "function": file_name+":"+str(line)+"("+function+")",
+                "calls": calls,
+                "primitive_calls": primitive_calls,
+                "own_seconds": own_time,
+                "seconds": cumulative_time,
+                }
+            for (file_name, line, function), (primitive_calls, calls, own_time, cumulative_time, callers)
+            in sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+            ]
+
+    def manifest(self, **extra):
+        """The run manifest; 'extra' gets added to it, e.g. the number of tests."""
+        import chess
+        from platform import python_version
+        counts = self.counts()
+        queries = counts.get("subset queries", 0)
+        manifest = {
+            "started": self.started,
+            "seconds": time()-self.started,
+            "python": python_version(),
+            "python-chess": chess.__version__,
+            "phases": self.phases,
+            "counters": counts,
+            "subset_hit_rate": counts.get("subset hits", 0)/queries if queries else None,
+            }
+        if self.profiler is not None:
+            manifest["hot_functions"] = self.hot_functions()
+        manifest.update(extra)
+        return manifest
+
+    def write_manifest(self, path, profile_path=None, **extra):
+        """
+        Writes the run manifest at 'path' as JSON and, if there is a cProfile capture
+        and a 'profile_path', dumps its stats there for pstats or other viewers.
+        """
+        with open(path, "w") as file:
+            dump(self.manifest(**extra), file, indent=2)
+        if self.profiler is not None and profile_path:
+            self.profiler.dump_stats(profile_path)
+
+
+
+class GenerateTestsFromPatterns:
+    def __init__(self, white_configurations=None, store=None, profile=False):
+        """
+        Use add_pattern to add patterns.
+
+        white_configurations: A WhiteConfigurationCache, e.g. one loaded from a previous run.
+
+        store: Where the tests are kept; a MemoryTestStore by default or an SQLiteTestStore
+               for the runs whose tests do not fit in memory.
+
+        profile: Capture a cProfile of the run in 'self.profile' (see RunProfile) along
+                 with the timers and the counters that are always kept.
+        """
+        self.profile = RunProfile(profile)
+        self.store = MemoryTestStore() if store is None else store
+        self.white_configurations = WhiteConfigurationCache() if white_configurations is None else white_configurations
         self.minimal_sufficient_material = MaterialCompositions()
-        self.FENs = set()
+        # The version of the minimal sufficient material that the checked tests were
+        # checked against; see correct_contradictions.
+        self.checked_version = 0
+        # The tests that __add_test stores go in there too, unless it is None.
+        self.added = None
+        # The pattern names and the compositions of the tests, so that the equal ones are
+        # shared; see __intern.
+        self.interned = dict()
+        # See save_checkpoint.
+        self.completed_phases = []
+        self.brute_force_progress = None
+        self.checkpoint_path = None
+        self.checkpoint_interval = 600
+        self.last_checkpoint = time()
         self.BB_BORDER = SquareSet(18411139144890810879)
         self.BB_BACKRANKS = SquareSet(BB_BACKRANKS)
         self.BB_DARK_SQUARES = SquareSet(BB_DARK_SQUARES)
         self.BB_LIGHT_SQUARES = SquareSet(BB_LIGHT_SQUARES)
 
+    def __intern(self, value):
+        return self.interned.setdefault(value, value)
+
     def __add(self, board):
-        if board.fen() in self.FENs:
+        key = board.position_key()
+        if key in self.store:
+            self.profile.counters["dedupe rejects"] += 1
             return None
         board.compute_white_composition()
         board.compute_black_composition()
-        board.has_sufficient_subset = lambda : self.minimal_sufficient_material.exists_subset_of(board)
-        if board.is_insufficient and board.has_sufficient_subset():
-            board.is_insufficient = False
-        if board.is_insufficient == False:
-            self.minimal_sufficient_material.add( board )
-        self.tests.setdefault(board.comment,[]).append( board )
-        self.FENs.add( board.fen() )
-        if board.bishops:
-            self.__add( board.mirror_vertical() )
+        self.__add_test( TestRecord.from_board(board, key) )
+
+    def __add_composition(self, position, white_composition, black_composition, sufficient_subset):
+        """Like __add for an entry of __brute_force_compositions; the test is only set up if it is not a duplicate."""
+        if position in self.store:
+            self.profile.counters["dedupe rejects"] += 1
+            return None
+        test = TestRecord(position, white_composition, black_composition, sufficient_subset is None, "brute-force")
+        test.sufficient_subset = sufficient_subset
+        self.__add_test( test )
+
+    def __add_brute_force(self, entry):
+        """Adds a board of __brute_force_boards or an entry of __brute_force_compositions."""
+        if isinstance(entry, tuple):
+            self.__add_composition(*entry)
+        else:
+            self.__add(entry)
+
+    def __add_test(self, test):
+        """Classifies and stores a test that is not a duplicate, followed by its vertical mirror."""
+        test.name = self.__intern(test.name)
+        test.white_composition = self.__intern(test.white_composition)
+        test.black_composition = self.__intern(test.black_composition)
+        if test.is_insufficient and self.has_sufficient_subset(test):
+            test.is_insufficient = False
+        if test.is_insufficient == False:
+            self.minimal_sufficient_material.add( test )
+        self.store.add( test )
+        self.profile.counters["tests"] += 1
+        if self.added is not None:
+            self.added.append( test )
+        if test.bishops:
+            self.profile.counters["mirrors"] += 1
+            mirrored = test.mirror_vertical()
+            if mirrored.position not in self.store:
+                self.__add_test( mirrored )
+            else:
+                self.profile.counters["dedupe rejects"] += 1
 
     def has_sufficient_subset(self, board):
-        return self.minimal_sufficient_material.exists_subset_of(board)
+        self.profile.counters["subset queries"] += 1
+        if self.minimal_sufficient_material.exists_subset_of(board):
+            self.profile.counters["subset hits"] += 1
+            return True
+        return False
 
+    @RunProfile.timed
     def add_pattern(self, name, black_pattern, black_king_square=A1, white=[], is_insufficient=False, generate_insufficient=True, dont_spam=False):
         """
         Creates tests for a given black pattern.
@@ -462,11 +1860,12 @@ class GenerateTestsFromPatterns:
         black_squares = [i[0] for i in black_pattern]
 
         base_board = WrappedBoard("8/8/8/8/8/8/8/8 b - - 0 1", name, is_insufficient)
+        self.profile.counters["boards"] += 1
         for square,piece in white:
             base_board.set_piece_at( square, Piece.from_symbol(piece) )
         base_board.set_piece_at( black_king_square, Piece.from_symbol("k") )
 
-        self.tests.setdefault(name,[])
+        self.store.add_name(name)
 
         self.add_boards_from(
             name,
@@ -485,22 +1884,27 @@ class GenerateTestsFromPatterns:
                     )
 
         if False:#not dont_spam:
-            for board in self.tests[name]:
+            for board in self.store[name]:
                 if board.is_checkmate()==board.is_insufficient:
                     print("In '",name,"' there exists a board such as\
                           \nboard.is_checkmate() == ",board.is_checkmate()," == board.is_insufficient",sep="")
                     board.print()
 
 
+    @RunProfile.timed
     def add_single_test(self, name, fen,  is_insufficient=False):
         board = WrappedBoard(fen,name,is_insufficient)
+        self.profile.counters["boards"] += 1
         self.__add( board )
 
+    @RunProfile.timed
     def add_tests_from_white_pattern(self, name, white_pattern, black_king_square=A1, is_insufficient=False):
         """Creates tests when a white pattern=[(sq,"pieces"),...] is given."""
-        white_combinations = self.__compute_combinations([piece for sq,piece in white_pattern])
-        for white_side in white_combinations:
+        if not white_pattern:
+            return
+        for white_side in self.__compute_combinations([piece for sq,piece in white_pattern]):
             board = WrappedBoard()
+            self.profile.counters["boards"] += 1
             board.set_piece_at(black_king_square,Piece.from_symbol("k"))
             for white_piece in white_side:
                 sq = board.get_empty_square()
@@ -510,104 +1914,114 @@ class GenerateTestsFromPatterns:
             self.__add( board )
 
     def __print_test(self,name):
-        return "\n".join([str(n)+".\n"+board.__str__()+"\n"+str(board.is_insufficient)+"\n" for n,board in enumerate(self.tests[name],1)])
+        return "\n".join([str(n)+".\n"+board.__str__()+"\n"+str(board.is_insufficient)+"\n" for n,board in enumerate(self.store[name],1)])
 
     def __repr__(self):
-        return self.tests.__repr__()
+        return self.store.__repr__()
 
     def __str__(self):
-        return "\n".join([name+":\n\n"+self.__print_test(name)+"\n" for name in self.tests])
+        return "\n".join([name+":\n\n"+self.__print_test(name)+"\n" for name in self.store.names()])
 
     def print_by_name(self,name):
         print("\n",name,":\n",sep="")
-        for n,j in enumerate(self.tests[name],1):
+        for n,j in enumerate(self.store[name],1):
             print(n,".",sep="")
             print(j)
             print(j.is_insufficient)
             print()
 
     def print(self):
-        for name in self.tests:
+        for name in self.store.names():
             self.print_by_name(name)
         print("Generated",len(self),"positions.")
 
-    def __compute_combinations(self, pattern, index=0, result=[]):
+    @staticmethod
+    def __compute_combinations(pattern):
         """
-        Computes the combinations from a pattern.
+        Yields the combinations from a pattern, one at a time.
 
-        e.g pattern=["ab","cde"]->["ac","ad","ae","bc","bd","be"]
+        e.g pattern=["ab","cde"]->"ac","ad","ae","bc","bd","be"
         """
-        if index == len(pattern):
-            return result
-        if result == []:
-            return self.__compute_combinations(pattern, index+1, pattern[index])
-        new_result = []
-        for comb in result:
-            for piece in pattern[index]:
-                new_result.append( "".join(comb+piece) )
-        return self.__compute_combinations(pattern, index+1, set(new_result))
+        yield from map("".join, product(*[dict.fromkeys(pieces) for pieces in pattern]))
+
+    def __boards_from(self, name, pattern, is_insufficient, base_board):
+        """Yields the test boards for a black pattern=list of (square, string)."""
+        for possibillity in self.__compute_combinations( [i[1] for i in pattern] ):
+            board = base_board.copy(stack=False)
+            self.profile.counters["boards"] += 1
+            board.comment = name
+            board.is_insufficient = is_insufficient
+            for (sq, _), symbol in zip(pattern, possibillity):
+                if symbol == "p" and base_board.is_backrank(sq):
+                    sq = board.get_empty_square()
+                board.set_piece_at( sq, Piece.from_symbol(symbol) )
+            yield board
 
     def add_boards_from(self, name, pattern, is_insufficient, base_board):
-        """Adds test boards for a black pattern=list of (square, string)."""
-        num_pieces = range(len(pattern))
-        baseFEN = base_board.fen()
-
-        black_combinations = self.__compute_combinations( [i[1] for i in pattern] )
-
-        for possibillity in black_combinations:
-            board = WrappedBoard( baseFEN, name, is_insufficient )
-            for i in num_pieces:
-                piece = Piece.from_symbol( possibillity[i] )
-                sq = pattern[i][0]
-                if possibillity[i] == "p" and base_board.is_backrank(sq):
-                    sq = board.get_empty_square()
-                board.set_piece_at( sq, piece )
-            self.__add( board )
+        """
+        Adds test boards for a black pattern=list of (square, string).
 
-        if black_combinations == []:
-            board = WrappedBoard( baseFEN, name, is_insufficient )
+        The boards are streamed one at a time through '__add', which dedupes,
+        classifies and stores them; nothing of the expansion is held in memory.
+        """
+        for board in self.__boards_from(name, pattern, is_insufficient, base_board):
             self.__add( board )
 
 
     def __anticombinations(self, pattern):
         """
-        Generates all the combinations of material that occupy the same squares
-        and is not covered by the given pattern.
-        """
-        default_pattern = dict([(i[0],"pbnrq") for i in pattern])
+        Yields all the combinations of material that occupy the same squares
+        and are not covered by the given pattern.
 
-        anti_patterns = set()
-
-        for i in pattern:
-            new_pattern = deepcopy(default_pattern)
-            new_pattern[i[0]] = "".join(
-                    set([j for j in new_pattern[i[0]]])
-                    .difference( [j for j in i[1]] )
+        Each combination is yielded exactly once, from the first square whose
+        piece is not allowed by the pattern.
+        """
+        allowed = [i[1] for i in pattern]
+        for n in range(len(pattern)):
+            yield from self.__compute_combinations(
+                allowed[:n]
+                + [ "".join(piece for piece in "pbnrq" if piece not in allowed[n]) ]
+                + [ "pbnrq" ]*(len(pattern)-n-1)
                 )
-            anti_patterns.update(  self.__compute_combinations( [new_pattern[j[0]] for j in pattern] )  )
-
-        return anti_patterns
 
     def __getitem__(self, name):
-        return self.tests[name]
+        return self.store[name]
 
     def __len__(self):
-        return sum([len(self.tests[name]) for name in self.tests])
+        return len(self.store)
+
+    def query(self, board, relation="subset", is_insufficient=None):
+        """
+        Yields the tests whose material is a "subset" of, a "superset" of or "exactly"
+        the material on 'board' (see WrappedBoard.__le__), through the composition index.
+
+        is_insufficient: Only yield the tests with that verdict, unless it is None.
+        """
+        if not hasattr(board, "white_composition"):
+            board.compute_white_composition()
+        if not hasattr(board, "black_composition"):
+            board.compute_black_composition()
+        if relation == "subset":
+            tests = self.store.subsets_of(board.white_composition, board.black_composition)
+        elif relation == "superset":
+            tests = self.store.supersets_of(board.white_composition, board.black_composition)
+        elif relation == "exactly":
+            tests = self.store.exactly(board.white_composition, board.black_composition)
+        else:
+            raise ValueError("Unknown relation: "+str(relation))
+        if is_insufficient is None:
+            return tests
+        return ( test for test in tests if test.is_insufficient == is_insufficient )
 
     def find_sufficient_subset_composition(self, board):
         """"Finds tests with sufficient material in the given board."""
-        for name in self.tests:
-            for n,candidate_board in enumerate(self.tests[name]):
-                if candidate_board.is_insufficient==False and candidate_board <= board:
-                    print(candidate_board.comment+", index:"+str(n),candidate_board,candidate_board.fen(),candidate_board.is_insufficient,sep="\n",end="\n\n")
+        return self.query(board, "subset", is_insufficient=False)
 
     def find_tests_with_subset_composition(self, board):
-        for name in self.tests:
-            for n,candidate_board in enumerate(self.tests[name]):
-                if candidate_board <= board:
-                    print(candidate_board.comment+", index:"+str(n),candidate_board,candidate_board.fen(),candidate_board.is_insufficient,sep="\n",end="\n\n")
+        return self.query(board, "subset")
 
 
+    @RunProfile.timed
     def randomised_tests(self, percentage=.1, correct=True):
         """
         Picks a percentage of the existing tests and adds some 'random' black
@@ -620,6 +2034,7 @@ class GenerateTestsFromPatterns:
 
         for n in range(limit):
             board = WrappedBoard()
+            self.profile.counters["boards"] += 1
             board.set_piece_at(A1,Piece.from_symbol("k"))
             white = randint(1,5)
             sq = 48 
@@ -636,12 +2051,14 @@ class GenerateTestsFromPatterns:
             self.correct_contradictions()
 
     
+    @RunProfile.timed
     def create_tests_with_pawns(self, percentage=.1, correct=True):
         from random import randint,sample
-        for name in deepcopy(self.tests):
-            limit = 1 + int(percentage*len(self.tests[name]))
-            for board in sample(self.tests[name], limit):
-                temp = board.deepcopy()
+        for name in self.store.names():
+            limit = 1 + int(percentage*self.store.count(name))
+            for board in self.store.sample(name, limit):
+                temp = board.to_board()
+                self.profile.counters["boards"] += 1
                 for sq in SquareSet(temp.occupied_co[True]):
                     if temp.is_backrank(sq):
                         temp.set_piece_at(sq, None)
@@ -652,21 +2069,26 @@ class GenerateTestsFromPatterns:
         if correct:
             self.correct_contradictions()
     
+    @RunProfile.timed
     def off_by_one(self, correct=True):
         """Generate tests with one more or one less black pieces from the existing tests."""
         newtests = dict()
-        for name in self.tests:
+        for name in self.store.names():
             newtests = []
-            for cand_board in self.tests[name]:
+            for cand_board in self.store[name]:
+                cand_board = cand_board.to_board()
+                self.profile.counters["boards"] += 1
                 sq = cand_board.get_empty_square()
                 for piece_type in range(1,6):
                     board = cand_board.deepcopy()
+                    self.profile.counters["boards"] += 1
                     board.set_piece_at(sq,Piece(piece_type,False))
                     newtests.append(board)
                 board.set_piece_at(sq,None)
                 for sq in SquareSet(cand_board.occupied_co[0]):
                     if cand_board.piece_type_at(sq)!=6:
                         board = cand_board.deepcopy()
+                        self.profile.counters["boards"] += 1
                         board.is_insufficient = True
                         board.set_piece_at(sq,None)
                         newtests.append(board)
@@ -678,7 +2100,8 @@ class GenerateTestsFromPatterns:
             self.correct_contradictions()
 
 
-    def correct_contradictions(self):
+    @RunProfile.timed
+    def correct_contradictions(self, processes=1):
         """
         Sometimes, when more than two patterns are used and anti-patterns are enabled,
         the generated tests produce contradictions.
@@ -695,119 +2118,623 @@ class GenerateTestsFromPatterns:
 
         Therefore white has sufficient material in the first case and we need to correct
         the value board.is_insufficient for the first board.
+
+        Only the tests added since the last call get checked, along with the insufficient
+        ones when the minimal sufficient material has grown since; those are checked once
+        for each pair of compositions. The tests that fail the sanity check are reported
+        together in a single exception and the first 'report_sample_size' of them get
+        printed. They stay unchecked.
+        The tests are checked in the batches of the store (see MemoryTestStore).
+
+        processes: The number of worker processes for the sanity check; see verify.
+        """
+        if self.minimal_sufficient_material.version != self.checked_version:
+            for composition in self.store.insufficient_compositions():
+                sufficient_subset = self.minimal_sufficient_material.find_subset_of(*composition)
+                self.profile.counters["subset queries"] += 1
+                if sufficient_subset is not None:
+                    self.profile.counters["subset hits"] += 1
+                    self.store.make_sufficient(composition, sufficient_subset)
+        self.checked_version = self.minimal_sufficient_material.version
+
+        failures = []
+        # One pool of workers checks all the batches.
+        with ProcessPoolExecutor(processes) if processes > 1 else nullcontext() as executor:
+            for tests in self.store.unchecked_batches():
+                for test in tests:
+                    self.__correct(test)
+                failed = [ mismatch["test"] for mismatch in self.verify(tests, processes, executor=executor) ]
+                self.store.checked(tests, failed)
+                failures.extend(failed)
+
+        if failures:
+            self.__report(failures)
+
+    @RunProfile.timed
+    def verify(self, tests=None, processes=1, chunk_size=50000, executor=None):
+        """
+        Checks the verdicts of the tests (all of them by default) against
+        WrappedBoard.has_insufficient_material and returns a list of the mismatches.
+        Each one is a dict with the 'test', its pattern 'name', its 'fen', its verdict
+        'is_insufficient', the 'has_insufficient_material' verdict and the
+        'sufficient_subset' that the verdict was based on, if any.
+
+        processes: The number of worker processes. The tests are sent to them in
+                   chunks of 'chunk_size' (position key, verdict) records.
+
+        executor: A ProcessPoolExecutor to send the chunks to, so that the callers that
+                  verify many batches start the workers once. One gets started for the
+                  call when it is None and there is more than one process.
         """
+        if executor is None and processes > 1:
+            with ProcessPoolExecutor(processes) as executor:
+                return self.verify(tests, processes, chunk_size, executor)
+        if tests is None:
+            return [ mismatch for tests in self.store.batches() for mismatch in self.verify(tests, processes, chunk_size, executor) ]
+        if not isinstance(tests, list):
+            tests = list(tests)
+        self.profile.counters["has_insufficient_material"] += len(tests)
+
+        if executor is not None:
+            chunks = [ [ (test.position_key(), test.is_insufficient) for test in tests[n:n+chunk_size] ] for n in range(0, len(tests), chunk_size) ]
+            results = executor.map(_verify_chunk, chunks)
+            mismatches = [ (n*chunk_size+i, verdict) for n, result in enumerate(results) for i, verdict in result ]
+        else:
+            mismatches = [ (i, not test.is_insufficient) for i, test in enumerate(tests) if not self.__is_sane(test) ]
+        self.profile.counters["fens"] += len(mismatches)
+
+        return [
+            {
+                "test": tests[i],
+                "name": tests[i].comment,
+                "fen": tests[i].fen(),
+                "is_insufficient": tests[i].is_insufficient,
+                "has_insufficient_material": verdict,
+                "sufficient_subset": getattr(tests[i], "sufficient_subset", None),
+                }
+            for i, verdict in mismatches
+            ]
+
+    # The number of failed tests that __report prints; the exception carries all of them.
+    report_sample_size = 10
+
+    def __report(self, failures):
+        for board in failures[:self.report_sample_size]:
+            board.print()
+        if len(failures) > self.report_sample_size:
+            print("... and "+str(len(failures)-self.report_sample_size)+" more tests failed the sanity check.\n")
+        raise Exception("Sanity check failed for "+str(len(failures))+" tests", failures)
 
-        for name in self.tests:
-            for n,board in enumerate(self.tests[name]):
-                if board.is_insufficient==True and board.has_sufficient_subset():
-                    self.tests[name][n].is_insufficient = False
+    @staticmethod
+    def __is_sane(board):
+        return board.is_insufficient == board.has_insufficient_material(True)
 
-                if board.is_insufficient != board.has_insufficient_material(True):
-                    board.print()
-                    raise Exception("Sanity check failed")
+    def __correct(self, board):
+        """
+        Corrects the verdict of a single test; see correct_contradictions.
+        Returns whether it passes the sanity check.
+        """
+        if board.is_insufficient==True and self.has_sufficient_subset(board):
+            board.is_insufficient = False
 
+        return self.__is_sane(board)
 
-    def __brute_force_black_side(self, king_board, black_side_num):
+
+    def __brute_force_black_side(self, king_board, black_side_num, first_pieces="pbnrq"):
         """
         Fills the 'king_board' with combinations of black material so that black has at most
-        'black_side_num' pieces and return a list with all those combinations.
+        'black_side_num' pieces and yields the board after each placed piece.
+        The first black piece that gets placed is one of 'first_pieces'.
+
+        The pieces are set and removed on 'king_board' itself and the black composition
+        is kept up to date along the way; a yielded board has to be copied if it is needed
+        after the search moves on.
         """
-        def rec(board, black_num):
+        board = king_board
+        white_composition = board.compute_white_composition()
+        black_composition = list(board.compute_black_composition())
+        counters = self.profile.counters
+
+        def rec(black_num, pieces="pbnrq"):
             if black_num==0:
                 return None
             sq = board.get_empty_square()
-            for black in "pbnrq":
-                temp_board = board.deepcopy()
-                temp_board.set_piece_at(sq,Piece.from_symbol(black))
-                temp_board.compute_white_composition()
-                temp_board.compute_black_composition()
-                temp_board.is_insufficient = not self.has_sufficient_subset(temp_board)
-                output.append(temp_board)
-                if not temp_board.is_insufficient:
+            colour = 5 if sq in self.BB_DARK_SQUARES else 6
+            for black in pieces:
+                piece = Piece.from_symbol(black)
+                changed = [1,colour] if black == "b" else ["pbnrq".index(black)]
+                board.set_piece_at(sq,piece)
+                for i in changed:
+                    black_composition[i] += 1
+                board.black_composition = tuple(black_composition)
+                is_insufficient = self.minimal_sufficient_material.find_subset_of(white_composition, board.black_composition) is None
+                counters["subset queries"] += 1
+                if not is_insufficient:
+                    counters["subset hits"] += 1
+                board.is_insufficient = is_insufficient
+                yield board
+                if not is_insufficient:
                     if black_num==2:
-                        rec(temp_board, 1)
+                        yield from rec(1)
                     elif black_num==1:
-                        rec(temp_board, 0)
+                        yield from rec(0)
                     else:
-                        rec(temp_board, 2)
+                        yield from rec(2)
                 else:
-                    rec(temp_board, black_num-1)
-        output = []
-        rec(king_board, black_side_num)
-        return output
+                    yield from rec(black_num-1)
+                for i in changed:
+                    black_composition[i] -= 1
+                board.remove_piece_at(sq)
+
+        return rec(black_side_num, first_pieces)
+
+    @staticmethod
+    def __black_compositions(max_black_pieces):
+        """
+        Yields the black compositions with one up to 'max_black_pieces' pieces,
+        with the bishops split in dark and light square bishops.
+        """
+        for num in range(1, max_black_pieces+1):
+            for pieces in combinations_with_replacement("pdlnrq", num):
+                pawns, dark, light, knights, rooks, queens = [pieces.count(piece) for piece in "pdlnrq"]
+                yield (pawns, dark+light, knights, rooks, queens, dark, light)
 
-    def brute_force_and_assess_positions(self, max_black_pieces=5, whites = [["Q"],["P"],["N"],["R"],["B"], ["Q","P"],["R","N"],["R","B"],["N","N"],["B","B"],["B",None,"B"],["B","N"]]):
-        """Generates positions with up to 'max_black_pieces' and assess them."""
+    @staticmethod
+    def __composition_position(white_position, black_composition):
+        """
+        The position key of the board that places the black material of 'black_composition'
+        next to the white side of 'white_position'; the bishops go on the first free squares
+        of their colour and then the pawns, knights, rooks and queens on the first free ones,
+        none of them on the backranks.
+        """
+        def first(squares, num):
+            taken = 0
+            for _ in range(num):
+                square = squares&-squares
+                taken |= square
+                squares ^= square
+            return taken
+
+        occupied = (white_position|white_position>>64|white_position>>128)&0xffff_ffff_ffff_ffff
+        free = 0x0000_ffff_ffff_ff00&~occupied
+        pawns, _, knights, rooks, queens, dark_bishops, light_bishops = black_composition
+        bishops = first(free&BB_DARK_SQUARES, dark_bishops) | first(free&BB_LIGHT_SQUARES, light_bishops)
+        free &= ~bishops
+        pawns = first(free, pawns)
+        free &= ~pawns
+        knights = first(free, knights)
+        free &= ~knights
+        rooks = first(free, rooks)
+        free &= ~rooks
+        queens = first(free, queens)
+        return (
+            white_position |
+            (pawns|bishops|queens) |
+            (knights|bishops)<<64 |
+            (rooks|queens)<<128 |
+            (pawns|bishops|knights|rooks|queens)<<192
+            )
+
+    def __brute_force_compositions(self, max_black_pieces, whites, first_pieces, white_indices, black_pieces=None):
+        """
+        Assesses every black composition against every white side once, without
+        setting up any boards. Yields (key, (position key, white composition,
+        black composition, sufficient subset)); see __add_composition.
+        Only the compositions with 'black_pieces' pieces are assessed, if it is given.
+        """
+        counters = self.profile.counters
+        white_sides = []
+        for j in white_indices:
+            white_board = WrappedBoard("8/8/8/8/8/8/8/8 b - - 0 1")
+            counters["boards"] += 1
+            white_board.set_piece_at(A1,Piece.from_symbol("k"))
+            for n,white in enumerate(whites[j]):
+                if white:
+                    white_board.set_piece_at(A7+n,Piece.from_symbol(white))
+            white_sides.append( (j, white_board.position_key(), white_board.compute_white_composition()) )
+
+        for ordinal, black_composition in enumerate(self.__black_compositions(max_black_pieces)):
+            pawns, _, knights, rooks, queens, dark, light = black_composition
+            if [ piece for piece, num in zip("pdlnrq",[pawns,dark,light,knights,rooks,queens]) if num ][0] not in first_pieces:
+                continue
+            if black_pieces is not None and pawns+dark+light+knights+rooks+queens != black_pieces:
+                continue
+            for j, white_position, white_composition in white_sides:
+                sufficient_subset = self.minimal_sufficient_material.find_subset_of(white_composition, black_composition)
+                counters["subset queries"] += 1
+                if sufficient_subset is not None:
+                    counters["subset hits"] += 1
+                position = self.__composition_position(white_position, black_composition)
+                yield (ordinal, j), (position, white_composition, black_composition, sufficient_subset)
+
+    def __brute_force_boards(self, max_black_pieces, whites, first_pieces, white_indices):
+        """
+        Yields (key, board) for the boards of the brute force search whose first black
+        piece is one of 'first_pieces' and whose white side is one of 'white_indices'.
+        The keys sort the boards in the order of the whole search.
+        """
         king_board = WrappedBoard()
         king_board.set_piece_at(A1,Piece.from_symbol("k"))
-        boards = self.__brute_force_black_side(king_board, max_black_pieces)
-        for board in boards:
-            for white_side in whites:
-                temp = board.deepcopy()
-                for n,white in enumerate(white_side):
-                    temp.set_piece_at(A7+n,Piece.from_symbol(white) if white else None)
-                self.add_single_test(
-                    "brute-force",
-                    temp.fen(),
-                    temp.is_insufficient
-                    )
+        counters = self.profile.counters
+        counters["boards"] += 1
+        for first_piece in first_pieces:
+            boards = self.__brute_force_black_side(king_board, max_black_pieces, first_piece)
+            for n,board in enumerate(boards):
+                for j in white_indices:
+                    test = board.copy(stack=False)
+                    counters["boards"] += 1
+                    test.comment = "brute-force"
+                    test.is_insufficient = board.is_insufficient
+                    for i,white in enumerate(whites[j]):
+                        test.set_piece_at(A7+i,Piece.from_symbol(white) if white else None)
+                    yield ("pbnrq".index(first_piece), n, j), test
+
+    def __brute_force(self, max_black_pieces, whites, by_composition, first_pieces=None, white_indices=None, black_pieces=None):
+        if by_composition:
+            return self.__brute_force_compositions(max_black_pieces, whites, first_pieces or "pdlnrq", white_indices or range(len(whites)), black_pieces)
+        return self.__brute_force_boards(max_black_pieces, whites, first_pieces or "pbnrq", white_indices or range(len(whites)))
+
+    @RunProfile.timed
+    def brute_force_and_assess_positions(self, max_black_pieces=5, whites = [["Q"],["P"],["N"],["R"],["B"], ["Q","P"],["R","N"],["R","B"],["N","N"],["B","B"],["B",None,"B"],["B","N"]], by_composition=False, processes=1):
+        """
+        Generates positions with up to 'max_black_pieces' and assess them.
+
+        by_composition: Generate a single position for every black material
+                        composition (the bishops split by colour) instead of
+                        one for every ordering of the black pieces.
+                        That keeps the run time manageable for 'max_black_pieces'
+                        up to 10 or more.
+
+        processes: The number of worker processes. The search gets split in shards
+                   by the first black piece and the white side. The tests are the
+                   same, in the same order, as the ones of a single process run.
+
+        A single process run is split in shards too; by the first black piece, or by
+        the number of black pieces with 'by_composition'. The completed shards are
+        kept in the checkpoints (see save_checkpoint), so that a resumed run skips them.
+        """
+        arguments = (max_black_pieces, [list(white) for white in whites], by_composition, processes > 1)
+        if self.brute_force_progress is None or self.brute_force_progress[0] != arguments:
+            self.brute_force_progress = (arguments, dict())
+        done = self.brute_force_progress[1]
+
+        if processes > 1:
+            self.__parallel_brute_force(max_black_pieces, whites, by_composition, processes, done)
+        else:
+            shards = range(1, max_black_pieces+1) if by_composition else "pbnrq"
+            for shard in shards:
+                if shard in done:
+                    continue
+                if by_composition:
+                    boards = self.__brute_force(max_black_pieces, whites, by_composition, black_pieces=shard)
+                else:
+                    boards = self.__brute_force(max_black_pieces, whites, by_composition, first_pieces=shard)
+                for key, entry in boards:
+                    self.__add_brute_force( entry )
+                done[shard] = None
+                self.checkpoint_if_due()
 
+        self.brute_force_progress = None
 
-    def export_to(self, file_name, preamble="", formatting=lambda x: x, epilogue="", write_type="w"):
+    def brute_force_shard(self, max_black_pieces, whites, by_composition, first_piece, white_index):
+        """
+        Runs the shard of brute_force_and_assess_positions with the given first black
+        piece and white side and returns the tests it added as a list of (key, depth,
+        position key, white composition, black composition, is_insufficient, sufficient
+        subset). The depth is 1 for the vertical mirrors and 0 for the rest of the tests.
+        """
+        output = []
+        for key, entry in self.__brute_force(max_black_pieces, whites, by_composition, first_piece, [white_index]):
+            self.added = []
+            self.__add_brute_force( entry )
+            for depth, test in enumerate(self.added):
+                output.append( (key, depth, test.position, test.white_composition, test.black_composition, test.is_insufficient, test.sufficient_subset) )
+        self.added = None
+        return output
+
+    def __parallel_brute_force(self, max_black_pieces, whites, by_composition, processes, done):
+        """The results of the completed shards are kept in 'done' as they come in."""
+        entries = [ (white_comp, black_comp, None) for white_comp, black_comp, board in self.minimal_sufficient_material.entries() ]
+        shards = [
+            (first_piece, white_index)
+            for first_piece in ("pdlnrq" if by_composition else "pbnrq")
+            for white_index in range(len(whites))
+            ]
+
+        with ProcessPoolExecutor(processes) as executor:
+            futures = {
+                executor.submit(_brute_force_shard, (entries, max_black_pieces, whites, by_composition)+shard): shard
+                for shard in shards if shard not in done
+                }
+            for future in as_completed(futures):
+                done[futures[future]] = future.result()
+                self.checkpoint_if_due()
+        results = [ done[shard] for shard in shards ]
+
+        for tests, new_entries in results:
+            self.minimal_sufficient_material.merge(
+                (white_comp, black_comp, TestRecord(position, white_comp, black_comp, False, "brute-force"))
+                for white_comp, black_comp, position in new_entries
+                )
+
+        # Replay the tests in the order of a single process run; a test that is already
+        # there is skipped together with its mirror, just like __add does.
+        skipped = None
+        name = self.__intern("brute-force")
+        self.store.add_name(name)
+        for key, depth, position, white_comp, black_comp, is_insufficient, sufficient_subset in sorted( test for tests, new_entries in results for test in tests ):
+            if key == skipped:
+                continue
+            if position in self.store:
+                self.profile.counters["dedupe rejects"] += 1
+                skipped = key
+                continue
+            test = TestRecord(position, self.__intern(white_comp), self.__intern(black_comp), is_insufficient, name)
+            if sufficient_subset is not None:
+                test.sufficient_subset = tuple( self.__intern(comp) for comp in sufficient_subset )
+            self.store.add( test )
+            self.profile.counters["tests"] += 1
+
+
+    checkpoint_header = b"HICP4"
+
+    @RunProfile.timed
+    def save_checkpoint(self, path=None):
+        """
+        Writes the state of the generator in a zlib compressed JSON file; the tests, the
+        minimal sufficient material, the completed phases (see phase) and the completed
+        shards of a brute force run that is underway. The white configuration cache is
+        left out; it has its own file. Like the cache, the file holds nothing but numbers,
+        strings and lists, so a checkpoint from elsewhere is safe to load.
+
+        The tests of an SQLiteTestStore are committed to its database instead and only its
+        path is written.
+        """
+        path = path or self.checkpoint_path
+        if isinstance(self.store, SQLiteTestStore):
+            self.store.commit()
+            store = (self.store.path, self.store.batch_size)
+            tests = []
+        else:
+            unchecked = set( id(test) for test in self.store.unchecked )
+            store = None
+            tests = [
+                ( name, [
+                    (test.position, test.white_composition, test.black_composition, test.is_insufficient,
+                     test.sufficient_subset, id(test) in unchecked)
+                    for test in self.store[name]
+                    ] )
+                for name in self.store.names()
+                ]
+        state = {
+            "store": store,
+            "tests": tests,
+            "minimal_sufficient_material": [
+                (white_comp, black_comp, None if board is None else board.position_key())
+                for white_comp, black_comp, board in self.minimal_sufficient_material.entries()
+                ],
+            "is_checked": self.checked_version == self.minimal_sufficient_material.version,
+            "completed_phases": self.completed_phases,
+            "brute_force_progress": None if self.brute_force_progress is None else [
+                self.brute_force_progress[0], list(self.brute_force_progress[1].items())
+                ],
+            }
+        # The file is swapped in once it is complete, so that a run that gets cut off
+        # while writing leaves the previous checkpoint in place.
+        with open(path+".tmp", "wb") as file:
+            file.write(self.checkpoint_header + compress(dumps_json(state).encode(), 6))
+        replace(path+".tmp", path)
+        self.last_checkpoint = time()
+
+    @classmethod
+    def load_checkpoint(cls, path):
+        """Sets up a generator from a file of save_checkpoint; it keeps checkpointing there."""
+        with open(path, "rb") as file:
+            data = file.read()
+        if not data.startswith(cls.checkpoint_header):
+            raise ValueError("Not a checkpoint: "+str(path))
+        state = loads_json(decompress(data[len(cls.checkpoint_header):]).decode())
+        tuples = cls.__tuples
+
+        generator = cls(store=None if state.get("store") is None else SQLiteTestStore(*state["store"]))
+        generator.checkpoint_path = path
+        records = dict()
+        unchecked = []
+        for name, tests in state["tests"]:
+            generator.store.add_name(name)
+            for position, white_comp, black_comp, is_insufficient, sufficient_subset, is_unchecked in tests:
+                white_comp, black_comp = tuples(white_comp), tuples(black_comp)
+                test = TestRecord(position, generator.interned.setdefault(white_comp, white_comp), generator.interned.setdefault(black_comp, black_comp), is_insufficient, name)
+                test.sufficient_subset = tuples(sufficient_subset)
+                generator.store.add(test)
+                records[position] = test
+                if is_unchecked:
+                    unchecked.append(test)
+        if state["tests"]:
+            # The tests come in as unchecked; the checked ones get grouped like after a check.
+            tests, generator.store.unchecked = generator.store.unchecked, []
+            generator.store.checked(tests, unchecked)
+
+        generator.minimal_sufficient_material.merge(
+            (tuples(white_comp), tuples(black_comp), records.get(position) or TestRecord(position, tuples(white_comp), tuples(black_comp), False))
+            for white_comp, black_comp, position in state["minimal_sufficient_material"]
+            )
+        if state["is_checked"]:
+            generator.checked_version = generator.minimal_sufficient_material.version
+        generator.completed_phases = state["completed_phases"]
+        if state["brute_force_progress"] is not None:
+            # The white sides of the arguments stay lists, like brute_force_and_assess_positions makes them.
+            (max_black_pieces, whites, by_composition, parallel), done = state["brute_force_progress"]
+            generator.brute_force_progress = (
+                (max_black_pieces, whites, by_composition, parallel),
+                dict( (tuples(shard), tuples(result)) for shard, result in done )
+                )
+        return generator
+
+    @staticmethod
+    def __tuples(value):
+        """Turns the lists of a value read from JSON back into tuples, e.g. the compositions."""
+        if isinstance(value, list):
+            return tuple( GenerateTestsFromPatterns.__tuples(item) for item in value )
+        return value
+
+    def checkpoint_if_due(self):
+        """Saves a checkpoint if there is a 'checkpoint_path' and 'checkpoint_interval' seconds went by since the last one."""
+        if self.checkpoint_path and time()-self.last_checkpoint >= self.checkpoint_interval:
+            self.save_checkpoint()
+
+    def phase(self, name):
+        """Does the phase 'name' of a run still have to be carried out? See complete_phase."""
+        return name not in self.completed_phases
+
+    def complete_phase(self, name):
+        """Marks the phase 'name' of a run as completed and saves a checkpoint if there is a 'checkpoint_path'."""
+        self.completed_phases.append(name)
+        if self.checkpoint_path:
+            self.save_checkpoint()
+
+    @staticmethod
+    def __opener(compression):
+        """Returns a function that opens a text file with the given compression and its extension."""
+        if compression is None:
+            return open, ""
+        if compression == "gzip":
+            from gzip import open as opener
+            extension = ".gz"
+        elif compression == "bz2":
+            from bz2 import open as opener
+            extension = ".bz2"
+        elif compression in ["xz","lzma"]:
+            from lzma import open as opener
+            extension = ".xz"
+        elif compression == "zstd":
+            # Python>=3.14
+            from compression.zstd import open as opener
+            extension = ".zst"
+        else:
+            raise ValueError("Unknown compression: "+str(compression))
+        return (lambda file_name, mode: opener(file_name, mode.replace("t","")+"t")), extension
+
+    @RunProfile.timed
+    def export_to(self, file_name, preamble="", formatting=lambda x: x, epilogue="", write_type="w", compression=None, max_shard_size=None, processes=1):
         """
         Writes the tests in a file.
         Includes a preamble before the tests, uses a formatting function and
         adds a epilogue after the tests.
-        """
 
-        self.correct_contradictions()
+        The tests get corrected first (see correct_contradictions). Then they are streamed
+        from the store; each one is written as soon as it is reached.
 
-        FENs = set()
-        refined_tests = []
+        compression: None, "gzip", "bz2", "xz" or "zstd" (Python>=3.14).
+                     The usual extension is appended to the file name.
 
-        for name in self.tests:
-            for board in self.tests[name]:
-                if board.fen() not in FENs:
-                    refined_tests.append(board)
-                    FENs.add(board.fen())
+        max_shard_size: When a file grows past that many characters, the rest of the
+                        tests go to 'file_name.1', 'file_name.2', etc. Every file gets
+                        the preamble and the epilogue. It cannot be used with a write_type
+                        that appends.
+
+        processes: The number of worker processes for the sanity check of the tests.
 
-        with open(file_name,write_type) as file:
+        Returns the names of the written files.
+        """
+        if compression is not None and "b" in write_type:
+            raise ValueError("The tests are written as text lines; a compressed file cannot be opened with write_type="+repr(write_type))
+        if max_shard_size and "a" in write_type:
+            raise ValueError("The shards are numbered from the first file on; they cannot be appended to with write_type="+repr(write_type))
+        self.correct_contradictions(processes)
+
+        opener, extension = self.__opener(compression)
+        file_names = []
+
+        def next_file():
+            file_names.append( file_name+("."+str(len(file_names)) if file_names else "")+extension )
+            if "a" in write_type and exists(file_names[-1]):
+                # The compressed formats can be read as the concatenation of their streams.
+                copyfile(file_names[-1], file_names[-1]+".tmp")
+            file = opener(file_names[-1]+".tmp", write_type)
             file.write(preamble)
-            for board in refined_tests:
-                file.write(formatting(board))
+            return file
+
+        # The files are written next to their names and only swapped in once all of them
+        # are complete, so a run that fails while exporting leaves no output behind. When
+        # appending, the file being written starts as a copy of the existing one.
+        file = next_file()
+        try:
+            size = len(preamble)
+            for test in self.store:
+                line = formatting(test)
+                if max_shard_size and size > len(preamble) and size+len(line) > max_shard_size:
+                    file.write(epilogue)
+                    file.close()
+                    file = next_file()
+                    size = len(preamble)
+                file.write(line)
+                size += len(line)
             file.write(epilogue)
+        except BaseException:
+            file.close()
+            for name in file_names:
+                if exists(name+".tmp"):
+                    remove(name+".tmp")
+            raise
+        file.close()
+
+        for name in file_names:
+            replace(name+".tmp", name)
+        return file_names
 
 
     def __piece(self, symbol):
         return Piece.from_symbol(symbol if symbol not in ["D","L"] else "B")
 
+    __posts = dict()
+
     def __find_posts_to_attack_from(self, target, piece_type):
-        board = Board.empty()
-        board.set_piece_at( target, self.__piece( piece_type ) )
-        if piece_type=="D":
-            if target in self.BB_DARK_SQUARES:
-                return board.attacks(target)
-            else:
-                return SquareSet(0)
-        elif piece_type=="L":
-            if target in self.BB_LIGHT_SQUARES:
-                return board.attacks(target)
+        """
+        The bitboard of the squares from which a piece of 'piece_type' (D/L for the
+        dark/light square bishops) attacks 'target' on an empty board. They are
+        memoized for every square and piece type.
+        """
+        key = (target, piece_type)
+        if key not in self.__posts:
+            if (piece_type=="D" and target not in self.BB_DARK_SQUARES) or (piece_type=="L" and target not in self.BB_LIGHT_SQUARES):
+                self.__posts[key] = 0
             else:
-                return SquareSet(0)
-        else:
-            return board.attacks(target)
+                self.__posts[key] = AttackTables.default().attacks[self.__piece(piece_type).piece_type][target]
+        return self.__posts[key]
+
+    def __is_discovered_check(self, king, board, mover, line):
+        """
+        Could the piece on 'mover' have just moved off the line between the king and
+        the piece on 'line', so that both of them give check?
+        """
+        if board.piece_type_at(line) not in [3,4,5]:
+            return False
+        return bool( SquareSet.between(king, line) & board.attacks(mover) )
 
     def __get_white_configurations(self, king, escape_squares, white_minor_pieces):
         """
         Generates possible white configurations that minimise the squares
         available to the king to which he can escape to when up to two
-        white minor pieces are given.
+        white pieces are given.
+
+        The configurations are kept in 'self.white_configurations' and reused.
         """
+        keys = self.white_configurations.get(king, white_minor_pieces)
+        if keys is None:
+            keys = self.__search_white_configurations(king, escape_squares, white_minor_pieces)
+            self.white_configurations.put(king, white_minor_pieces, keys)
+        self.profile.counters["boards"] += len(keys)
+        return [WrappedBoard.from_position_key(key) for key in keys]
+
+    def __search_white_configurations(self, king, escape_squares, white_minor_pieces):
+        """Returns the sorted position keys of the configurations of __get_white_configurations."""
         boards = []
 
         for n,checker in enumerate(white_minor_pieces):
-            for sq in self.__find_posts_to_attack_from(king, checker):
+            for sq in SquareSet(self.__find_posts_to_attack_from(king, checker)):
                 board = WrappedBoard('8/8/8/8/8/8/8/8 b - - 0 1', "", True)
+                self.profile.counters["boards"] += 1
                 board.set_piece_at( king, Piece(6, False) )
                 board.set_piece_at( sq, self.__piece(checker) )
                 board.checker = checker
@@ -819,11 +2746,11 @@ class GenerateTestsFromPatterns:
         if len(white_minor_pieces) == 1:
             output = set()
             for board in boards:
-                if board.checker != "N" and board.bishops & int(self.BB_BORDER) == 0:
+                if board.checker != "N" and board.occupied_co[1] & int(self.BB_BORDER) == 0:
                     # discard some cases to reduce the search space
                     continue
-                output.add(board.fen())
-            return [WrappedBoard(fen) for fen in output]
+                output.add(board.position_key())
+            return sorted(output)
 
         output = set()
         for board in boards:
@@ -831,10 +2758,11 @@ class GenerateTestsFromPatterns:
             checker_sq = board.checker_sq
             not_checker = board.not_checker
             for esc_sq in escape_squares:
-                for sq in self.__find_posts_to_attack_from(esc_sq, not_checker):
+                for sq in SquareSet(self.__find_posts_to_attack_from(esc_sq, not_checker)):
                     if checker_sq == sq:
                         continue
                     temp_board = board.deepcopy()
+                    self.profile.counters["boards"] += 1
                     temp_board.set_piece_at( sq, self.__piece(not_checker) )
                     if temp_board.is_legal( Move(king, sq) ) or temp_board.is_legal( Move(king, checker_sq) ) or not temp_board.is_check() or len(temp_board.checkers())==2:
                         continue
@@ -846,12 +2774,13 @@ class GenerateTestsFromPatterns:
                         if temp_board.occupied_co[1]&0x007e_7e7e_7e7e_7e00!=0:
                             # discard some cases to reduce the total number of cases
                             continue
-                    output.add( temp_board.fen() )
+                    output.add( temp_board.position_key() )
             if white_minor_pieces == ['D','N'] or white_minor_pieces == ['L','N']: #double check
-                for sq in self.__find_posts_to_attack_from(king, not_checker):
+                for sq in SquareSet(self.__find_posts_to_attack_from(king, not_checker)):
                     if checker_sq == sq:
                         continue
                     temp_board = board.deepcopy()
+                    self.profile.counters["boards"] += 1
                     temp_board.set_piece_at( sq, self.__piece(not_checker) )
                     if temp_board.is_legal( Move(king, sq) ) or temp_board.is_legal( Move(king, checker_sq) ) or not temp_board.is_check():
                         continue
@@ -864,95 +2793,126 @@ class GenerateTestsFromPatterns:
                         continue
                     if len(SquareSet.between(king,bishop)&temp_board.attacks(knight)) == 0:
                         continue
-                    output.add(temp_board.fen())
+                    output.add(temp_board.position_key())
+            elif "R" in white_minor_pieces or "Q" in white_minor_pieces: #double check
+                for sq in SquareSet(self.__find_posts_to_attack_from(king, not_checker)):
+                    if checker_sq == sq:
+                        continue
+                    temp_board = board.deepcopy()
+                    self.profile.counters["boards"] += 1
+                    temp_board.set_piece_at( sq, self.__piece(not_checker) )
+                    if temp_board.is_legal( Move(king, sq) ) or temp_board.is_legal( Move(king, checker_sq) ) or len(temp_board.checkers())!=2:
+                        continue
+                    if not ( self.__is_discovered_check(king, temp_board, sq, checker_sq) or self.__is_discovered_check(king, temp_board, checker_sq, sq) ):
+                        continue
+                    output.add(temp_board.position_key())
 
-        return [WrappedBoard(fen) for fen in output]
+        return sorted(output)
 
 
-    def __can_piece_save_king(self, board, piece, squares_to_stop_check):
+    def __can_piece_save_king(self, piece_type, square, squares_to_stop_check, occupied, white, pins):
         """
-        Is the piece able to attack one of the 'squares_to_stop_check'
-        and save their king?
+        Is a black piece of 'piece_type' on 'square' able to move to one of the
+        'squares_to_stop_check' and save their king? See AttackTables.
         """
-        for sq in squares_to_stop_check:
-            try:
-                board.find_move(piece, sq)
-                return True
-            except ValueError:
-                pass
-        return False            
+        tables = AttackTables.default()
+        if piece_type == 1:
+            reached = tables.black_pawn_reaches(square, squares_to_stop_check, occupied, white)
+        else:
+            reached = tables.reaches(piece_type, square, squares_to_stop_check, occupied)
+        return bool( reached & pins.get(square, reached) )
 
     def __get_black_configurations(self, king, escape_squares, white_board):
         """
         Fills the empty squares around the king with black pieces
         so white mates and returns a board with the found pattern.
+        The pattern is None when the king cannot get mated that way.
         """
         white_board.black_pattern = []
+        white_board.available_squares = []
         checkers = white_board.checkers()
 
         for checker_sq in checkers:
+            self.profile.counters["find_move probes"] += 1
             try:
                 white_board.find_move(king, checker_sq)
+                white_board.black_pattern = None
                 return white_board
             except ValueError:
                 pass
 
+        # The king is lifted so that the squares behind him on the line of a checker
+        # count as attacked.
+        white_board.remove_piece_at(king)
         available_squares = [sq for sq in escape_squares if not white_board.is_attacked_by(True,sq)]
+        white_board.set_piece_at(king, Piece(6,False))
+        white_board.available_squares = available_squares
         
-        if popcount(checkers)>1:
+        if len(checkers)>1:
             for sq in available_squares:
                 white_board.black_pattern.append(
                     (sq,"bnrq") if white_board.is_backrank(sq) else (sq,"pnbrq")
                     )
             return white_board
 
-        squares_to_stop_check = (
-            SquareSet.from_square(checker_sq)|white_board.attacks(checker_sq)
-            )&(~white_board.occupied_co[0])
-        
+        # The check is stopped by capturing the checker or by moving in its way.
+        tables = AttackTables.default()
+        squares_to_stop_check = BB_SQUARES[checker_sq] | tables.between[king][checker_sq]
+        occupied = white_board.occupied
         for sq in available_squares:
-            white_board.set_piece_at(sq, Piece.from_symbol("p"))
-        
+            occupied |= BB_SQUARES[sq]
+        white = white_board.occupied_co[1]
+        pins = tables.pins(
+            king,
+            [ (sq, white_board.piece_type_at(sq)) for sq in SquareSet(white & (white_board.bishops|white_board.rooks|white_board.queens)) ],
+            occupied
+            )
+        can_save_king = lambda piece_type: self.__can_piece_save_king(piece_type, black_piece, squares_to_stop_check, occupied, white, pins)
+
         for black_piece in available_squares:
             possible_pieces = ""
 
             if black_piece not in self.BB_BACKRANKS:
-                white_board.set_piece_at(black_piece,Piece.from_symbol("p"))
-                if self.__can_piece_save_king(white_board, black_piece, squares_to_stop_check)==False:
+                if not can_save_king(1):
                     possible_pieces += "p"
 
-            white_board.set_piece_at(black_piece,Piece.from_symbol("n"))
-            if self.__can_piece_save_king(white_board, black_piece, squares_to_stop_check)==False:
+            if not can_save_king(2):
                 possible_pieces += "n"
 
-            white_board.set_piece_at(black_piece,Piece.from_symbol("q"))
-            if self.__can_piece_save_king(white_board, black_piece, squares_to_stop_check)==False:
+            if not can_save_king(5):
                 possible_pieces += "brq"
             else:
-                white_board.set_piece_at(black_piece,Piece.from_symbol("b"))
-                if self.__can_piece_save_king(white_board, black_piece, squares_to_stop_check)==False:
+                if not can_save_king(3):
                     possible_pieces += "b"
 
-                white_board.set_piece_at(black_piece,Piece.from_symbol("r"))
-                if self.__can_piece_save_king(white_board, black_piece, squares_to_stop_check)==False:
+                if not can_save_king(4):
                     possible_pieces += "r"
 
-            white_board.set_piece_at(black_piece,Piece.from_symbol("p"))
-
             if possible_pieces == "":
-                white_board.black_pattern == None
+                white_board.black_pattern = None
                 break
             else:
                 white_board.black_pattern.append((black_piece,possible_pieces))
 
-        for sq in available_squares:
-            white_board.set_piece_at(sq, None) 
+        if white_board.black_pattern:
+            # __is_mate_with sets up a copy of the board.
+            self.profile.counters["boards"] += 1
+            if not self.__is_mate_with(white_board, white_board.black_pattern):
+                raise AssertionError("The attack tables disagree with the board on "+white_board.fen()+" for the pattern "+str(white_board.black_pattern))
 
         return white_board
 
+    @staticmethod
+    def __is_mate_with(white_board, black_pattern):
+        """Confirms on the board that the first pieces of a pattern mate the king."""
+        board = white_board.copy(stack=False)
+        for sq, pieces in black_pattern:
+            board.set_piece_at( sq, Piece.from_symbol(pieces[0]) )
+        return board.is_checkmate()
+
 
     def print_patterns(self, king_square, white_pieces):
-        """The current implementation only works for minor pieces."""
+        """Prints the patterns for up to two white pieces; see generate_patterns."""
         board=Board.empty()
         board.set_piece_at(king_square,Piece.from_symbol("k"))
         escape_squares = board.attacks(king_square)
@@ -960,8 +2920,10 @@ class GenerateTestsFromPatterns:
         patterns = list( (board, self.__get_black_configurations( king_square, escape_squares, board ).black_pattern)  for board in white_boards )
         output = []
         for board, pattern in patterns:
+            if not pattern:
+                continue
             nxt = [(square_name(i[0]).upper(),"".join([lt if lt!="b" else ("d" if i[0] in self.BB_DARK_SQUARES else "l") for lt in i[1]])) for i in pattern], [square_name(sq).upper() for sq in SquareSet(board.occupied_co[1])]
-            if pattern and nxt not in output:
+            if nxt not in output:
                 output.append(nxt)
                 s = ""
                 for j in nxt[0]:
@@ -970,42 +2932,191 @@ class GenerateTestsFromPatterns:
         return output
     
 
-    def generate_patterns( self, white_sides = [ ['D'], ['N'], ['D','N'], ['N','N'], ['D','L'], ['D','D'] ], king_squares = [A1,A2,A3,A4] ):
-        """
-        Finds mating patterns for the given white sides.
-        The current implementation only works for minor pieces.
-        """
-        ## D=dark square bishop, L=light square bishop
-        for king in king_squares:
-            board = WrappedBoard('8/8/8/8/8/8/8/8 b - - 0 1')
-            board.set_piece_at(king,Piece(6,False))
-            escape_squares = board.attacks(king)
-            for white_side in white_sides:
-                white_configurations = self.__get_white_configurations(king, escape_squares, white_side)
-                for white_configuration in white_configurations:
-                    board_with_pattern = self.__get_black_configurations(king, escape_squares, white_configuration)
-                    white_configuration.compute_white_composition()
-                    self.add_boards_from(
-                        str(white_configuration.white_composition).replace("'","").replace(", ","-"),
-                        board_with_pattern.black_pattern,
-                        False,
-                        white_configuration
-                        )
-
-
-
+    @staticmethod
+    def __pattern_name(white_composition):
+        return str(white_composition).replace("'","").replace(", ","-")
 
+    @staticmethod
+    def __image_of(symmetry, king, white_side):
+        """The king square and the (sorted) white side that a symmetry maps them to."""
+        name, transform, swaps_colours = symmetry
+        if swaps_colours:
+            white_side = [ {"D":"L","L":"D"}.get(piece, piece) for piece in white_side ]
+        return msb(transform(BB_SQUARES[king])), tuple(sorted(white_side))
+
+    def __orbit_searches(self, king_squares, white_sides):
+        """
+        Returns a dict from every (king square, white side) pair to the indices of the
+        WrappedBoard.SYMMETRIES that map it to one of the given pairs.
+        """
+        pairs = [ (king, tuple(sorted(white_side))) for king in king_squares for white_side in white_sides ]
+        return {
+            pair: [ index for index, symmetry in enumerate(WrappedBoard.SYMMETRIES) if self.__image_of(symmetry, *pair) in pairs ]
+            for pair in pairs
+            }
 
+    def __pattern_symmetries(self, symmetries, available_squares):
+        """
+        The indices in 'symmetries' that map a searched pattern to the pattern of its image.
 
-if __name__ == "__main__":
+        The black pawns only keep their moves under the file flip, so the rest of the
+        symmetries are kept when no pawn can stand on the available escape squares or
+        on their images.
+        """
+        if all( WrappedBoard.is_backrank(sq) for sq in available_squares ):
+            return [
+                index for index in symmetries
+                if index < 2 or all( WrappedBoard.is_backrank( msb(WrappedBoard.SYMMETRIES[index][1](BB_SQUARES[sq])) ) for sq in available_squares )
+                ]
+        return [ index for index in symmetries if index < 2 ]
+
+    def __add_images(self, tests, king, index, white_composition):
+        """
+        Adds the images under SYMMETRIES[index] of the 'tests' of a configuration searched
+        with the king on 'king', named after the pattern of the image. The vertical mirrors
+        of the tests are skipped; __add_test adds the mirrors of the images instead. So are
+        the images that would put a pawn on a backrank.
+        """
+        symmetry = WrappedBoard.SYMMETRIES[index]
+        name = self.__pattern_name( WrappedBoard.mirror_composition(white_composition) if symmetry[2] else white_composition )
+        self.store.add_name(name)
+        for test in tests:
+            if test.kings != BB_SQUARES[king]:
+                continue
+            image = test.transform_symmetry(symmetry)
+            if image.pawns & BB_BACKRANKS:
+                continue
+            if image.position in self.store:
+                self.profile.counters["dedupe rejects"] += 1
+                continue
+            image.name = name
+            self.__add_test( image )
+
+    def search_patterns(self, king, white_side, searched=()):
+        """
+        Yields the white configurations for a king square and a white side, each one
+        with the 'black_pattern' that mates the king and the 'available_squares'
+        around the king that the pattern fills (see __get_black_configurations).
+        The configurations whose position key is in 'searched' are skipped.
+        """
+        board = WrappedBoard('8/8/8/8/8/8/8/8 b - - 0 1')
+        self.profile.counters["boards"] += 1
+        board.set_piece_at(king,Piece(6,False))
+        escape_squares = board.attacks(king)
+        for white_configuration in self.__get_white_configurations(king, escape_squares, list(white_side)):
+            if white_configuration.position_key() in searched:
+                continue
+            board_with_pattern = self.__get_black_configurations(king, escape_squares, white_configuration)
+            if board_with_pattern.black_pattern is not None:
+                yield board_with_pattern
+
+    @RunProfile.timed
+    def generate_patterns( self, white_sides = [ ['D'], ['N'], ['D','N'], ['N','N'], ['D','L'], ['D','D'] ], king_squares = [A1,A2,A3,A4], processes=1 ):
+        """
+        Finds mating patterns for the given white sides of up to two pieces;
+        D=dark square bishop, L=light square bishop, N, R and Q.
 
-    start = time()
+        Only one (king square, white configuration) of every orbit under the symmetries
+        of the board gets searched. The images of its tests under the symmetries that give
+        the rest of the orbit are added as tests right after them.
 
-    print("Test generation is underway...")
+        processes: The number of worker processes. Every (king square, white side) gets
+                   searched in a worker and the patterns are added in the order of a
+                   single process run, so the tests are the same.
+        """
+        searches = self.__orbit_searches(king_squares, white_sides)
+        if processes > 1:
+            with ProcessPoolExecutor(processes) as executor:
+                found = list(executor.map(_pattern_search, searches))
+        else:
+            found = [None]*len(searches)
 
-    insufficient_material = GenerateTestsFromPatterns()
+        searched = set()
+        for ((king, white_side), symmetries), patterns in zip(searches.items(), found):
+            if patterns is None:
+                white_configurations = self.search_patterns(king, white_side, searched)
+            else:
+                white_configurations = self.__configurations_from(patterns)
+            for white_configuration in white_configurations:
+                key = white_configuration.position_key()
+                if key in searched:
+                    continue
+                images = dict()
+                for index in self.__pattern_symmetries(symmetries, white_configuration.available_squares):
+                    images.setdefault( WrappedBoard.transform_position_key(key, WrappedBoard.SYMMETRIES[index][1]), index )
+                searched.update(images)
+
+                white_configuration.compute_white_composition()
+                white_composition = white_configuration.white_composition
+                name = self.__pattern_name(white_composition)
+                self.store.add_name(name)
+                self.added = []
+                self.add_boards_from(
+                    name,
+                    white_configuration.black_pattern,
+                    False,
+                    white_configuration
+                    )
 
+                tests, self.added = self.added, None
+                for index in images.values():
+                    if index != 0:
+                        self.__add_images(tests, king, index, white_composition)
 
+    @staticmethod
+    def __configurations_from(patterns):
+        """Sets up the white configurations of the (position key, available squares, black pattern) of _pattern_search."""
+        for key, available_squares, black_pattern in patterns:
+            white_configuration = WrappedBoard.from_position_key(key)
+            white_configuration.available_squares = available_squares
+            white_configuration.black_pattern = black_pattern
+            yield white_configuration
+
+
+
+
+
+def _brute_force_shard(arguments):
+    """Runs a shard of GenerateTestsFromPatterns.brute_force_and_assess_positions in a worker process."""
+    entries, max_black_pieces, whites, by_composition, first_piece, white_index = arguments
+    generator = GenerateTestsFromPatterns()
+    generator.minimal_sufficient_material.merge(entries)
+    known = set( (white_comp, black_comp) for white_comp, black_comp, board in entries )
+    tests = generator.brute_force_shard(max_black_pieces, whites, by_composition, first_piece, white_index)
+    new_entries = [
+        (white_comp, black_comp, board.position)
+        for white_comp, black_comp, board in generator.minimal_sufficient_material.entries()
+        if (white_comp, black_comp) not in known
+        ]
+    return tests, new_entries
+
+
+def _verify_chunk(records):
+    """
+    Checks a chunk of (position key, verdict) records of GenerateTestsFromPatterns.verify
+    in a worker process. Returns (index, has_insufficient_material verdict) for the
+    records that disagree.
+    """
+    mismatches = []
+    for i, (position, is_insufficient) in enumerate(records):
+        verdict = WrappedBoard.from_position_key(position).has_insufficient_material(True)
+        if verdict != is_insufficient:
+            mismatches.append( (i, verdict) )
+    return mismatches
+
+
+def _pattern_search(pair):
+    """Runs GenerateTestsFromPatterns.search_patterns for a (king square, white side) in a worker process."""
+    king, white_side = pair
+    return [
+        (board.position_key(), board.available_squares, board.black_pattern)
+        for board in GenerateTestsFromPatterns().search_patterns(king, white_side)
+        ]
+
+
+
+def _add_patterns(insufficient_material):
+    """Adds the hand-made patterns; the first phase of the run below."""
     #print("Generating patterns with knights and bishops...",end="")
     #insufficient_material.generate_patterns()
     #print(" (",len(insufficient_material)," positions found)", sep="")
@@ -1344,6 +3455,29 @@ if __name__ == "__main__":
         )
 
 
+
+if __name__ == "__main__":
+
+    start = time()
+
+    print("Test generation is underway...")
+
+    # The state gets saved after every phase and every so often during the brute force
+    # search; a run that gets cut off resumes from where it was.
+    checkpoint = abspath("./horde_white_insufficient_material_tests.checkpoint")
+    if exists(checkpoint):
+        print("Resuming from '"+checkpoint+"'")
+        insufficient_material = GenerateTestsFromPatterns.load_checkpoint(checkpoint)
+    else:
+        insufficient_material = GenerateTestsFromPatterns()
+        insufficient_material.checkpoint_path = checkpoint
+
+
+    if insufficient_material.phase("patterns"):
+        _add_patterns(insufficient_material)
+        insufficient_material.complete_phase("patterns")
+
+
     print("All the patterns got processed in "+str(time()-start)+"s.")
     print(len(insufficient_material),"tests created so far.")
 
@@ -1353,17 +3487,23 @@ if __name__ == "__main__":
 ##    print(len(insufficient_material),"tests created so far.")
 
 
-    print("Generating all tests with 5 or less black pieces")
-    insufficient_material.brute_force_and_assess_positions(5)
-    print(len(insufficient_material),"tests created so far.")
+    if insufficient_material.phase("brute force"):
+        print("Generating all tests with 5 or less black pieces")
+        insufficient_material.brute_force_and_assess_positions(5)
+        insufficient_material.complete_phase("brute force")
+        print(len(insufficient_material),"tests created so far.")
 
-    print("Generating some positions with white pawns")
-    insufficient_material.create_tests_with_pawns(correct=False)
-    print(len(insufficient_material),"tests created so far.")
+    if insufficient_material.phase("pawns"):
+        print("Generating some positions with white pawns")
+        insufficient_material.create_tests_with_pawns(correct=False)
+        insufficient_material.complete_phase("pawns")
+        print(len(insufficient_material),"tests created so far.")
 
-    print("Generating more random tests...")
-    insufficient_material.randomised_tests(percentage=.9,correct=False)
-    print(len(insufficient_material),"tests created so far.")
+    if insufficient_material.phase("random"):
+        print("Generating more random tests...")
+        insufficient_material.randomised_tests(percentage=.9,correct=False)
+        insufficient_material.complete_phase("random")
+        print(len(insufficient_material),"tests created so far.")
 
 
     print("Writing tests to disk...")
@@ -1373,6 +3513,13 @@ if __name__ == "__main__":
         lambda board: board.fen()+','+str(board.is_insufficient).lower()+','+board.comment+'\n',
         ""
         )
+    if exists(checkpoint):
+        remove(checkpoint)
+
+    insufficient_material.profile.write_manifest(
+        abspath("./horde_white_insufficient_material_tests.json"),
+        tests=len(insufficient_material)
+        )
 
     input(str(len(insufficient_material))+" tests were generated at 'white_insufficient_material_horde' in "+str(time()-start)+"s.")
 
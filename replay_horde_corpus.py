@@ -0,0 +1,329 @@
+from generate_horde_insufficient_material_tests import MaterialSignatureTable, WrappedBoard
+
+from chess import WHITE
+from chess.pgn import BaseVisitor, SKIP, read_game
+from chess.variant import HordeBoard
+from argparse import ArgumentParser
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import StringIO
+from json import dump
+from os.path import abspath
+from time import time
+
+
+def open_corpus(path):
+    """Opens a (possibly compressed) PGN or FEN dump in text mode; the compression is told by the extension."""
+    if path.endswith(".gz"):
+        from gzip import open as opener
+    elif path.endswith(".bz2"):
+        from bz2 import open as opener
+    elif path.endswith(".xz"):
+        from lzma import open as opener
+    elif path.endswith(".zst"):
+        # Python>=3.14
+        from compression.zstd import open as opener
+    else:
+        opener = open
+    return opener(path, "rt", encoding="utf-8", errors="replace")
+
+
+def is_pgn(path):
+    return ".pgn" in path.lower()
+
+
+def read_horde_games(file):
+    """
+    Yields the text of the Horde games of a PGN file one by one, so that a dump of any
+    size is read in constant memory. Games of other variants are dropped before they are parsed.
+    """
+    lines, is_horde, in_movetext = [], False, False
+    for line in file:
+        if line.startswith("[") and in_movetext:
+            if is_horde:
+                yield "".join(lines)
+            lines, is_horde, in_movetext = [], False, False
+        if line.startswith("["):
+            if line.startswith("[Variant ") and "horde" in line.lower():
+                is_horde = True
+        elif not line.isspace():
+            in_movetext = True
+        lines.append(line)
+    if is_horde and in_movetext:
+        yield "".join(lines)
+
+
+def read_fens(file):
+    """Yields the non-empty lines of a FEN dump; e.g. the files written by GenerateTestsFromPatterns.export_to."""
+    for line in file:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def describe(signature):
+    """The material of a packed signature of MaterialSignatureTable; a '+' marks a count that was clamped."""
+    def side(shift, symbols, clamps):
+        text = ""
+        for i, (symbol, clamp) in enumerate(zip(symbols, clamps)):
+            count = (signature>>(shift+2*i))&3
+            text += symbol*count + ("+" if count == clamp else "")
+        return text
+    white = side(0, ["P","N","R","Q","B(d)","B(l)"], [3,3,3,3,2,2])
+    black = side(12, ["p","n","r","q","b(d)","b(l)"], [3,3,3,3,3,3])
+    return (white or "-")+" vs k"+black
+
+
+class DisagreementReport:
+    """
+    The disagreements found in a corpus aggregated by their kind, the packed material signature of
+    the position and the two verdicts. Only the first 'max_examples' positions of each group are kept,
+    so the report stays as small as the number of material signatures however large the corpus is.
+
+    The kinds are:
+      - "library": WrappedBoard.has_insufficient_material differs from chess.variant.HordeBoard's
+      - "result": the result of a game lost on time differs from the one the verdict implies
+      - "expected": the verdict differs from the one written next to the FEN of the dump
+    """
+
+    def __init__(self, max_examples=3):
+        self.max_examples = max_examples
+        self.games = 0
+        self.positions = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.groups = {}
+
+    def add(self, kind, board, ours, theirs, example):
+        key = (kind, MaterialSignatureTable.pack_board(board), ours, theirs)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = [0, []]
+        group[0] += 1
+        if len(group[1]) < self.max_examples:
+            group[1].append(example)
+
+    def merge(self, other):
+        self.games += other.games
+        self.positions += other.positions
+        self.timeouts += other.timeouts
+        self.errors += other.errors
+        for key, (count, examples) in other.groups.items():
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = [0, []]
+            group[0] += count
+            group[1].extend(examples[:self.max_examples-len(group[1])])
+
+    def disagreements(self, kind=None):
+        return sum(count for key, (count, _) in self.groups.items() if kind in [None, key[0]])
+
+    def to_json(self):
+        kinds = {}
+        for (kind, signature, ours, theirs), (count, examples) in sorted(self.groups.items(), key=lambda item: -item[1][0]):
+            kinds.setdefault(kind, []).append({
+                "material": describe(signature),
+                "signature": signature,
+                "ours": ours,
+                "theirs": theirs,
+                "count": count,
+                "examples": examples
+                })
+        return {
+            "games": self.games,
+            "positions": self.positions,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "disagreements": {kind: {"count": sum(group["count"] for group in groups), "groups": groups} for kind, groups in kinds.items()}
+            }
+
+
+class AuditVisitor(BaseVisitor):
+    """
+    Replays the mainline of a Horde game on the board of the PGN parser and assesses the
+    position after every capture or promotion, and the final one. The verdicts are read off
+    the bitboards of the parser's board, so no position is copied or set up again.
+    """
+
+    def __init__(self, report):
+        self.report = report
+
+    def begin_game(self):
+        self.headers = {}
+        self.board = None
+        # The verdict on the position after the last move, if that move changed the material.
+        self.verdict = None
+        self.ply = 0
+        self.material_changed = False
+        self.skipped = False
+
+    def visit_header(self, tagname, tagvalue):
+        self.headers[tagname] = tagvalue
+
+    def end_headers(self):
+        if "horde" not in self.headers.get("Variant", "").lower():
+            self.skipped = True
+            return SKIP
+
+    def begin_variation(self):
+        return SKIP
+
+    def visit_move(self, board, move):
+        self.ply += 1
+        self.material_changed = board.is_capture(move) or move.promotion is not None
+
+    def visit_board(self, board):
+        self.board = board
+        self.verdict = None
+        if self.material_changed:
+            self.material_changed = False
+            self.verdict = self.assess(board)
+
+    def handle_error(self, error):
+        self.report.errors += 1
+        self.skipped = True
+
+    def assess(self, board):
+        """Returns our verdict after comparing it with the one of python-chess."""
+        report = self.report
+        report.positions += 1
+        ours = WrappedBoard.has_insufficient_material(board, True)
+        theirs = HordeBoard.has_insufficient_material(board, WHITE)
+        if ours != theirs:
+            report.add("library", board, ours, theirs, self.example(board))
+        return ours
+
+    def example(self, board):
+        return {"game": self.headers.get("Site") or self.headers.get("Event", "?"), "ply": self.ply, "fen": board.fen()}
+
+    def end_game(self):
+        if self.skipped or self.board is None:
+            return
+        report = self.report
+        report.games += 1
+        board = self.board
+        # A final position that came with a capture or promotion is assessed already.
+        ours = self.assess(board) if self.verdict is None else self.verdict
+
+        # The side to move at the end of a game lost on time is the one that flagged.
+        if self.headers.get("Termination", "").lower() == "time forfeit":
+            report.timeouts += 1
+            if board.turn == WHITE:
+                expected = "0-1"
+            else:
+                expected = "1/2-1/2" if ours else "1-0"
+            result = self.headers.get("Result", "*")
+            if result != expected:
+                report.add("result", board, ours, result, self.example(board))
+
+    def result(self):
+        return self.report
+
+
+def audit_games(games, max_examples=3):
+    """Replays the text of the PGN games and returns the report of the disagreements."""
+    report = DisagreementReport(max_examples)
+    for text in games:
+        read_game(StringIO(text), Visitor=lambda: AuditVisitor(report))
+    return report
+
+
+def audit_fens(lines, max_examples=3):
+    """
+    Assesses the positions of a FEN dump; a line is a FEN that may be followed by
+    the expected verdict and a comment, separated by commas.
+    """
+    report = DisagreementReport(max_examples)
+    for line in lines:
+        fields = line.split(",")
+        try:
+            board = HordeBoard(fields[0])
+        except ValueError:
+            report.errors += 1
+            continue
+        report.positions += 1
+        ours = WrappedBoard.has_insufficient_material(board, True)
+        theirs = board.has_insufficient_material(WHITE)
+        example = {"line": line}
+        if ours != theirs:
+            report.add("library", board, ours, theirs, example)
+        if len(fields) > 1 and fields[1].strip().lower() in ["true", "false"]:
+            expected = fields[1].strip().lower() == "true"
+            if ours != expected:
+                report.add("expected", board, ours, expected, example)
+    return report
+
+
+def replay(paths, processes=1, batch_size=200, max_examples=3):
+    """
+    Audits the corpora at 'paths'. The games (or FEN lines) are read lazily and handed out in
+    batches to 'processes' workers; at most two batches per worker are in flight at any time,
+    so the memory is the same for a corpus of any size.
+    """
+    report = DisagreementReport(max_examples)
+
+    def jobs():
+        for path in paths:
+            with open_corpus(path) as file:
+                if is_pgn(path):
+                    for batch in batches(read_horde_games(file), batch_size):
+                        yield audit_games, batch
+                else:
+                    for batch in batches(read_fens(file), batch_size):
+                        yield audit_fens, batch
+
+    if processes == 1:
+        for function, batch in jobs():
+            report.merge(function(batch, max_examples))
+        return report
+
+    with ProcessPoolExecutor(processes) as executor:
+        pending = set()
+        for function, batch in jobs():
+            if len(pending) >= 2*processes:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    report.merge(future.result())
+            pending.add(executor.submit(function, batch, max_examples))
+        for future in wait(pending).done:
+            report.merge(future.result())
+    return report
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Replays Horde games and FEN dumps and reports where the insufficient material verdicts disagree.")
+    parser.add_argument("paths", nargs="+", help="PGN files (with '.pgn' in their name) or FEN dumps; .gz, .bz2, .xz and .zst are read as they are")
+    parser.add_argument("--processes", type=int, default=1, help="the number of worker processes")
+    parser.add_argument("--batch-size", type=int, default=200, help="the games or FEN lines handed to a worker at a time")
+    parser.add_argument("--max-examples", type=int, default=3, help="the positions kept for each group of disagreements")
+    parser.add_argument("--report", default=abspath("./horde_insufficient_material_audit.json"), help="where the report is written")
+    arguments = parser.parse_args()
+
+    start = time()
+    report = replay(arguments.paths, arguments.processes, arguments.batch_size, arguments.max_examples)
+    elapsed = time()-start
+
+    print("Replayed", report.games, "games and assessed", report.positions, "positions in", str(round(elapsed,1))+"s", "("+str(round(report.positions/max(elapsed,1e-9)))+" positions/s)")
+    if report.errors:
+        print(report.errors, "games or lines could not be read")
+    for kind in ["library", "result", "expected"]:
+        count = report.disagreements(kind)
+        if count:
+            print(" ", kind+":", count, "disagreements")
+    if not report.groups:
+        print("No disagreements")
+
+    with open(arguments.report, "w") as file:
+        dump(report.to_json(), file, indent=2)
+    print("The report was written at '"+arguments.report+"'")
@@ -0,0 +1,53 @@
+"""Positions shared by the tests; they are the same for the same seed."""
+
+from generate_horde_insufficient_material_tests import WrappedBoard
+
+from chess import Piece
+from itertools import combinations_with_replacement
+from random import Random
+
+
+HORDE_START = "rnbqkbnr/pppppppp/8/1PP2PP1/PPPPPPPP/PPPPPPPP/PPPPPPPP/PPPPPPPP w kq - 0 1"
+
+# The white sides of every rule branch of has_insufficient_material.
+BRANCHES = [
+    ("lone queen", ["Q"]),
+    ("lone rook", ["R"]),
+    ("lone bishop", ["B"]),
+    ("lone knight", ["N"]),
+    ("lone pawn", ["P"]),
+    ("two minor pieces", ["BN", "NN", "BB"]),
+    ("three pieces", [ "".join(side) for side in combinations_with_replacement("PNBRQ", 3) ]),
+    ("four or more pieces", [ "".join(side) for n in (4,5,6) for side in combinations_with_replacement("PNBRQ", n) ]),
+    ]
+
+
+def random_position(random, white_side, max_black_pieces=8):
+    """A black king, the 'white_side' and up to 'max_black_pieces' black pieces on random squares."""
+    board = WrappedBoard()
+    squares = list(range(64))
+    random.shuffle(squares)
+    board.set_piece_at(squares.pop(), Piece.from_symbol("k"))
+    pieces = list(white_side) + [ random.choice("pbnrq") for _ in range(random.randint(0, max_black_pieces)) ]
+    for symbol in pieces:
+        square = next( sq for sq in squares if symbol not in "Pp" or not WrappedBoard.is_backrank(sq) )
+        squares.remove(square)
+        board.set_piece_at(square, Piece.from_symbol(symbol))
+    return board
+
+
+def position_corpus(seed, size=500):
+    """'size' positions for every rule branch."""
+    random = Random(seed)
+    return [ (branch, [ random_position(random, random.choice(white_sides)) for _ in range(size) ]) for branch, white_sides in BRANCHES ]
+
+
+def random_game(random, max_moves=150):
+    """The moves of a random game from the starting position of horde."""
+    board = WrappedBoard(HORDE_START)
+    for _ in range(max_moves):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(random.choice(moves))
+    return board.move_stack
@@ -0,0 +1,47 @@
+from generate_horde_insufficient_material_tests import AttackTables, WrappedBoard
+
+from chess import BB_SQUARES, BLACK, WHITE, Piece, SquareSet
+from random import Random
+
+
+def random_board(random):
+    board = WrappedBoard()
+    board.turn = BLACK
+    for sq in random.sample(range(64), random.randint(2, 20)):
+        board.set_piece_at(sq, Piece.from_symbol(random.choice("NBRQnbrq" if WrappedBoard.is_backrank(sq) else "PNBRQpnbrq")))
+    return board
+
+
+def moves_from(board, sq):
+    return sum( BB_SQUARES[to] for to in set( move.to_square for move in board.generate_pseudo_legal_moves(BB_SQUARES[sq]) ) )
+
+
+def test_piece_attacks_match_the_board():
+    tables, random = AttackTables.default(), Random(2024)
+    for _ in range(300):
+        board = random_board(random)
+        for sq in SquareSet(board.occupied & ~board.pawns):
+            assert tables.reaches(board.piece_type_at(sq), sq, 2**64-1, board.occupied) == int(board.attacks(sq)), (board.fen(), sq)
+
+
+def test_black_pawn_moves_match_the_board():
+    tables, random = AttackTables.default(), Random(2025)
+    for _ in range(300):
+        board = random_board(random)
+        for sq in SquareSet(board.pawns & board.occupied_co[BLACK]):
+            reached = tables.black_pawn_reaches(sq, 2**64-1, board.occupied, board.occupied_co[WHITE])
+            assert reached == moves_from(board, sq), (board.fen(), sq)
+
+
+def test_pins_match_the_board():
+    tables, random = AttackTables.default(), Random(2026)
+    for _ in range(300):
+        board = random_board(random)
+        king = random.choice([ sq for sq in range(64) if not board.piece_at(sq) ])
+        board.set_piece_at(king, Piece.from_symbol("k"))
+        sliders = [ (sq, board.piece_type_at(sq)) for sq in SquareSet(board.occupied_co[WHITE] & (board.bishops|board.rooks|board.queens)) ]
+        pinned = tables.pins(king, sliders, board.occupied)
+        for sq in SquareSet(board.occupied_co[BLACK] & ~board.kings):
+            assert (sq in pinned) == board.is_pinned(BLACK, sq), (board.fen(), sq)
+            if sq in pinned:
+                assert pinned[sq] & ~int(board.pin(BLACK, sq)) == 0
@@ -0,0 +1,39 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns
+
+from chess import A2, C1
+import pytest
+
+
+def brute_force(by_composition, processes):
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    generator.brute_force_and_assess_positions(4, by_composition=by_composition, processes=processes)
+    return generator
+
+
+def stored(generator):
+    return [
+        (test.position, test.white_composition, test.black_composition, test.is_insufficient, test.comment, test.sufficient_subset is None)
+        for test in generator.store
+        ]
+
+
+def covers(material, other):
+    """Does every composition of 'other' have a subset in 'material'?"""
+    return all( material.find_subset_of(white_comp, black_comp) is not None for white_comp, black_comp, board in other.entries() )
+
+
+@pytest.mark.parametrize("by_composition", [False, True])
+def test_parallel_brute_force_matches_a_single_process(by_composition):
+    """
+    The tests come in the same order, with the same verdicts. The merged minimal sufficient material is an
+    antichain, unlike the one of a single process, but the two have the same supersets.
+    """
+    serial, parallel = brute_force(by_composition, 1), brute_force(by_composition, 2)
+    assert stored(parallel) == stored(serial)
+    # A shard can come across a different sufficient subset first; it has to be one the single process knows too.
+    for test in parallel.store:
+        if test.sufficient_subset is not None:
+            assert serial.minimal_sufficient_material.find_subset_of(*test.sufficient_subset) is not None
+    assert covers(parallel.minimal_sufficient_material, serial.minimal_sufficient_material)
+    assert covers(serial.minimal_sufficient_material, parallel.minimal_sufficient_material)
@@ -0,0 +1,44 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns, WrappedBoard
+
+from chess import A1, A2, C1, H8, Piece
+import pytest
+
+
+def copied_search(generator, king_board, black_side_num, first_pieces):
+    """The search with a copy of the board for every node."""
+    def rec(board, black_num, pieces="pbnrq"):
+        if black_num==0:
+            return None
+        sq = board.get_empty_square()
+        for black in pieces:
+            temp_board = board.deepcopy()
+            temp_board.set_piece_at(sq,Piece.from_symbol(black))
+            temp_board.compute_white_composition()
+            temp_board.compute_black_composition()
+            temp_board.is_insufficient = not generator.has_sufficient_subset(temp_board)
+            output.append(temp_board)
+            if not temp_board.is_insufficient:
+                rec(temp_board, {2: 1, 1: 0}.get(black_num, 2))
+            else:
+                rec(temp_board, black_num-1)
+    output = []
+    rec(king_board, black_side_num, first_pieces)
+    return output
+
+
+@pytest.mark.parametrize("first_pieces", ["p", "b", "pbnrq"])
+def test_make_unmake_visits_the_boards_of_the_copied_search(first_pieces):
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    king_board = WrappedBoard()
+    king_board.set_piece_at(A1,Piece.from_symbol("k"))
+    king_board.set_piece_at(H8,Piece.from_symbol("Q"))
+    fen = king_board.fen()
+
+    expected = [ (board.fen(), board.is_insufficient, board.black_composition) for board in copied_search(generator, king_board, 4, first_pieces) ]
+    search = generator._GenerateTestsFromPatterns__brute_force_black_side(king_board, 4, first_pieces)
+    visited = [ (board.fen(), board.is_insufficient, board.black_composition) for board in search ]
+
+    assert visited == expected
+    assert any( not is_insufficient for fen, is_insufficient, black_composition in visited )
+    assert king_board.fen() == fen
@@ -0,0 +1,91 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns
+
+from chess import A1, A2, C1
+import json, zlib
+import pytest
+
+
+def new_generator():
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    return generator
+
+
+def stored(generator):
+    return [ test for test in generator.store ]
+
+
+def state_of(generator):
+    return (
+        [ (test.position, test.white_composition, test.black_composition, test.is_insufficient, test.comment, test.sufficient_subset) for test in stored(generator) ],
+        sorted( test.position for test in generator.store.unchecked ),
+        sorted( (white_comp, black_comp, board.position_key()) for white_comp, black_comp, board in generator.minimal_sufficient_material.entries() ),
+        generator.checked_version == generator.minimal_sufficient_material.version,
+        generator.completed_phases,
+        generator.brute_force_progress,
+        )
+
+
+def test_checkpoint_round_trip(tmp_path):
+    """Checked and unchecked tests, their sufficient subsets and the progress of a brute force run."""
+    generator = GenerateTestsFromPatterns()
+    generator.generate_patterns(white_sides=[["D"], ["N"], ["D","L"]], king_squares=[A1, A2])
+    generator.correct_contradictions()
+    generator.complete_phase("patterns")
+    generator.brute_force_and_assess_positions(3, whites=[["B"], ["N"]], by_composition=True)
+    path = str(tmp_path/"run.checkpoint")
+    generator.save_checkpoint(path)
+
+    loaded = GenerateTestsFromPatterns.load_checkpoint(path)
+    assert loaded.checkpoint_path == path
+    assert state_of(loaded) == state_of(generator)
+
+
+def test_checkpoint_is_plain_json(tmp_path):
+    """Nothing in the file gets executed when it is loaded."""
+    generator = new_generator()
+    generator.brute_force_progress = ((3, [["Q"]], False, True), {("p", 0): ([], [])})
+    path = str(tmp_path/"run.checkpoint")
+    generator.save_checkpoint(path)
+    with open(path, "rb") as file:
+        data = file.read()
+    assert data.startswith(GenerateTestsFromPatterns.checkpoint_header)
+    state = json.loads(zlib.decompress(data[len(GenerateTestsFromPatterns.checkpoint_header):]))
+    assert state["brute_force_progress"] == [[3, [["Q"]], False, True], [[["p", 0], [[], []]]]]
+    assert GenerateTestsFromPatterns.load_checkpoint(path).brute_force_progress == ((3, [["Q"]], False, True), {("p", 0): ((), ())})
+
+
+def test_checkpoint_of_another_file(tmp_path):
+    path = tmp_path/"run.checkpoint"
+    path.write_bytes(b"not a checkpoint")
+    with pytest.raises(ValueError):
+        GenerateTestsFromPatterns.load_checkpoint(str(path))
+
+
+@pytest.mark.parametrize("by_composition, processes", [(False, 1), (True, 1), (False, 2)])
+def test_resumed_brute_force_matches_an_uninterrupted_one(tmp_path, by_composition, processes):
+    """The run is cut off after its second checkpoint and resumed from it."""
+    generator = new_generator()
+    generator.brute_force_and_assess_positions(4, by_composition=by_composition, processes=processes)
+    expected = [ (test.position, test.is_insufficient, test.comment) for test in stored(generator) ]
+
+    generator = new_generator()
+    generator.checkpoint_path = str(tmp_path/"run.checkpoint")
+    generator.checkpoint_interval = 0
+    save_checkpoint = generator.save_checkpoint
+    checkpoints = []
+
+    def cut_off(path=None):
+        save_checkpoint(path)
+        checkpoints.append(path)
+        if len(checkpoints) == 2:
+            raise KeyboardInterrupt
+
+    generator.save_checkpoint = cut_off
+    with pytest.raises(KeyboardInterrupt):
+        generator.brute_force_and_assess_positions(4, by_composition=by_composition, processes=processes)
+
+    resumed = GenerateTestsFromPatterns.load_checkpoint(generator.checkpoint_path)
+    assert resumed.brute_force_progress[1]
+    resumed.brute_force_and_assess_positions(4, by_composition=by_composition, processes=processes)
+    assert [ (test.position, test.is_insufficient, test.comment) for test in stored(resumed) ] == expected
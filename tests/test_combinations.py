@@ -0,0 +1,27 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns
+
+from chess import A2, B1, B2, C2
+from itertools import product
+import pytest
+
+
+PATTERNS = [
+    [(A2,"pr")],
+    [(A2,"pnb"), (B1,"nr")],
+    [(A2,"q"), (B1,"pbnrq"), (B2,"bn")],
+    [(A2,"pbnrq"), (B1,"pbnrq")],
+    [(A2,"pp"), (B1,"n"), (B2,"r"), (C2,"bq")],
+    ]
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_anticombinations_are_a_disjoint_complement(pattern):
+    generator = GenerateTestsFromPatterns()
+    combinations = list(generator._GenerateTestsFromPatterns__compute_combinations([ pieces for sq, pieces in pattern ]))
+    anticombinations = list(generator._GenerateTestsFromPatterns__anticombinations(pattern))
+    everything = set( "".join(pieces) for pieces in product("pbnrq", repeat=len(pattern)) )
+
+    assert len(combinations) == len(set(combinations))
+    assert len(anticombinations) == len(set(anticombinations))
+    assert set(combinations) | set(anticombinations) == everything
+    assert not set(combinations) & set(anticombinations)
@@ -0,0 +1,77 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns
+
+from chess import A2, B1, B2, C1, C3
+import pytest
+
+
+def counting_subset_queries(generator):
+    queries = []
+    material = generator.minimal_sufficient_material
+    find_subset_of = material.find_subset_of
+    def counted(white_composition, black_composition):
+        queries.append((white_composition, black_composition))
+        return find_subset_of(white_composition, black_composition)
+    material.find_subset_of = counted
+    return queries
+
+
+def test_checked_tests_are_not_checked_again():
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    generator.correct_contradictions()
+    assert generator.store.unchecked == []
+    assert generator.checked_version == generator.minimal_sufficient_material.version
+    groups = len(generator.store.insufficient_groups)
+    assert groups > 0
+
+    queries = counting_subset_queries(generator)
+    generator.correct_contradictions()
+    assert queries == []
+
+    # New insufficient tests only; the known ones stay as they are.
+    generator.add_pattern("white=Q, queen", [(B2,"qn")], white=[(C1,"Q")], is_insufficient=True, generate_insufficient=False)
+    version = generator.minimal_sufficient_material.version
+    del queries[:]
+    generator.correct_contradictions()
+    assert generator.minimal_sufficient_material.version == version
+    assert len(queries) == len(generator["white=Q, queen"]) > 0
+
+    # A new sufficient composition checks every group of insufficient tests once.
+    del queries[:]
+    generator.add_pattern("white=Q, two bishops", [(A2,"b"),(B1,"b")], white=[(C3,"Q")], generate_insufficient=False)
+    assert generator.minimal_sufficient_material.version > version
+    groups = len(generator.store.insufficient_groups)
+    generator.correct_contradictions()
+    assert len(queries) == groups
+
+
+def test_contradictions_are_corrected():
+    """The example of correct_contradictions: a rook on A2 is enough for a queen on C1."""
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("white=Q, stuck", [(A2,"r")], white=[(C3,"Q")], is_insufficient=True, generate_insufficient=False)
+    generator.add_pattern("white=Q", [(A2,"r")], white=[(C1,"Q")], generate_insufficient=False)
+    generator.correct_contradictions()
+    assert [ test.is_insufficient for test in generator["white=Q, stuck"] ] == [False]*len(generator["white=Q, stuck"])
+
+
+def test_failures_are_reported_together_and_stay_unchecked():
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("wrong", [(A2,"n"),(B1,"n")], white=[(C3,"N")], generate_insufficient=False)
+    wrong = generator["wrong"]
+    for _ in range(2):
+        with pytest.raises(Exception) as error:
+            generator.correct_contradictions()
+        assert error.value.args[1] == wrong
+        assert generator.store.unchecked == wrong
+
+
+def test_only_a_sample_of_the_failures_is_printed(capsys):
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("wrong", [(A2,"n"),(B1,"n")], white=[(C3,"N")], generate_insufficient=False)
+    generator.report_sample_size = 0
+    with pytest.raises(Exception) as error:
+        generator.correct_contradictions()
+    assert error.value.args[1] == generator["wrong"]
+    output = capsys.readouterr().out
+    assert "wrong" not in output
+    assert "1 more tests failed" in output
@@ -0,0 +1,73 @@
+from generate_horde_insufficient_material_tests import MaterialCompositions, WrappedBoard
+from tests.helpers import position_corpus
+
+from random import Random
+
+
+def linear_scan(compositions, white_composition, black_composition):
+    """Every pair of 'compositions' below the given ones, the black pawns in excess promoted."""
+    found = []
+    for white_comp, black_comps in compositions.material.items():
+        if white_comp[0] > white_composition[0] or any( white_comp[j] > white_composition[j] for j in range(2,7) ):
+            continue
+        for black_comp in black_comps:
+            residual_pawns = black_composition[0] - black_comp[0]
+            for j in range(2,7):
+                if black_comp[j] > black_composition[j]:
+                    residual_pawns += black_composition[j] - black_comp[j]
+            if black_comp[0] <= black_composition[0] and residual_pawns >= 0:
+                found.append((white_comp, black_comp))
+    return found
+
+
+def compositions_of(fens):
+    compositions = MaterialCompositions()
+    for fen in fens:
+        board = WrappedBoard(fen)
+        board.compute_white_composition()
+        board.compute_black_composition()
+        compositions.add(board)
+    return compositions
+
+
+def test_find_subset_of_matches_a_linear_scan():
+    random = Random(2024)
+    boards = [ board for branch, boards in position_corpus(2024, 30) for board in boards ]
+    for board in boards:
+        board.compute_white_composition()
+        board.compute_black_composition()
+    compositions = MaterialCompositions()
+    for board in random.sample(boards, 60):
+        compositions.add(board)
+    found = 0
+    for board in boards:
+        expected = linear_scan(compositions, board.white_composition, board.black_composition)
+        subset = compositions.find_subset_of(board.white_composition, board.black_composition)
+        if expected:
+            assert subset in expected, board.fen()
+            found += 1
+        else:
+            assert subset is None, board.fen()
+    assert 0 < found < len(boards)
+
+
+def test_black_pawns_can_promote_to_the_pieces_in_excess():
+    # Black has a knight and a bishop on a light square.
+    compositions = compositions_of(["8/8/8/8/8/8/n7/kbQ5 b - - 0 1"])
+    queen = (0, 0, 0, 0, 1, 0, 0)
+    assert compositions.find_subset_of(queen, (0, 1, 1, 0, 0, 0, 1)) is not None
+    # A pawn for the knight and another one for the bishop.
+    assert compositions.find_subset_of(queen, (2, 0, 0, 0, 0, 0, 0)) is not None
+    assert compositions.find_subset_of(queen, (1, 1, 0, 0, 0, 0, 1)) is not None
+    assert compositions.find_subset_of(queen, (1, 0, 0, 0, 0, 0, 0)) is None
+    assert compositions.find_subset_of(queen, (0, 0, 1, 1, 0, 0, 0)) is None
+
+
+def test_mirrored_bishop_colours_are_indexed():
+    # The white bishop is on a dark square, the black one on a light square.
+    compositions = compositions_of(["8/8/8/8/8/8/1B6/kb6 b - - 0 1"])
+    white, black = (0, 1, 0, 0, 0, 1, 0), (0, 1, 0, 0, 0, 0, 1)
+    assert compositions.find_subset_of(white, black) == (white, black)
+    mirrored_white, mirrored_black = (0, 1, 0, 0, 0, 0, 1), (0, 1, 0, 0, 0, 1, 0)
+    assert compositions.find_subset_of(mirrored_white, mirrored_black) == (mirrored_white, mirrored_black)
+    assert compositions.find_subset_of(white, mirrored_black) is None
@@ -0,0 +1,93 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns
+
+from chess import A2, C1
+import bz2, gzip, lzma
+import pytest
+
+
+PREAMBLE, EPILOGUE = "tests = [\n", "]\n"
+
+
+def formatting(board):
+    return "  (\""+board.fen()+"\", "+str(board.is_insufficient)+"),\n"
+
+
+@pytest.fixture
+def generator():
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    return generator
+
+
+def lines_of(generator):
+    generator.correct_contradictions()
+    lines = dict()
+    for board in generator.store:
+        lines.setdefault(board.fen(), formatting(board))
+    return list(lines.values())
+
+
+def test_export(generator, tmp_path):
+    file_name = str(tmp_path/"tests.py")
+    assert generator.export_to(file_name, PREAMBLE, formatting, EPILOGUE) == [file_name]
+    with open(file_name) as file:
+        assert file.read() == PREAMBLE+"".join(lines_of(generator))+EPILOGUE
+
+
+@pytest.mark.parametrize("compression, extension, opener", [("gzip", ".gz", gzip.open), ("bz2", ".bz2", bz2.open), ("xz", ".xz", lzma.open)])
+def test_compressed_export(generator, tmp_path, compression, extension, opener):
+    file_name = str(tmp_path/"tests.py")
+    assert generator.export_to(file_name, PREAMBLE, formatting, EPILOGUE, compression=compression) == [file_name+extension]
+    with opener(file_name+extension, "rt") as file:
+        assert file.read() == PREAMBLE+"".join(lines_of(generator))+EPILOGUE
+
+
+COMPRESSIONS = [(None, "", open), ("gzip", ".gz", gzip.open), ("bz2", ".bz2", bz2.open), ("xz", ".xz", lzma.open)]
+
+
+@pytest.mark.parametrize("compression, extension, opener", COMPRESSIONS)
+def test_append(generator, tmp_path, compression, extension, opener):
+    """The tests go after the content that is already there, and no .tmp file is left behind."""
+    file_name = str(tmp_path/"tests.py")
+    with opener(file_name+extension, "wt") as file:
+        file.write("# Earlier tests\n")
+    assert generator.export_to(file_name, PREAMBLE, formatting, EPILOGUE, write_type="a", compression=compression) == [file_name+extension]
+    with opener(file_name+extension, "rt") as file:
+        assert file.read() == "# Earlier tests\n"+PREAMBLE+"".join(lines_of(generator))+EPILOGUE
+    assert sorted( path.name for path in tmp_path.iterdir() ) == ["tests.py"+extension]
+
+
+def test_append_to_a_new_file(generator, tmp_path):
+    file_name = str(tmp_path/"tests.py")
+    generator.export_to(file_name, PREAMBLE, formatting, EPILOGUE, write_type="a")
+    with open(file_name) as file:
+        assert file.read() == PREAMBLE+"".join(lines_of(generator))+EPILOGUE
+
+
+def test_append_to_shards(generator, tmp_path):
+    with pytest.raises(ValueError):
+        generator.export_to(str(tmp_path/"tests.py"), PREAMBLE, formatting, EPILOGUE, write_type="a", max_shard_size=120)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unknown_compression(generator, tmp_path):
+    with pytest.raises(ValueError):
+        generator.export_to(str(tmp_path/"tests.py"), compression="rar")
+
+
+@pytest.mark.parametrize("compression, extension, opener", COMPRESSIONS)
+def test_shards(generator, tmp_path, compression, extension, opener):
+    """Every shard is a complete file and no shard but a single test one grows past the limit."""
+    file_name, max_shard_size = str(tmp_path/"tests.py"), 120
+    file_names = generator.export_to(file_name, PREAMBLE, formatting, EPILOGUE, compression=compression, max_shard_size=max_shard_size)
+    assert file_names == [file_name+extension]+[ file_name+"."+str(n)+extension for n in range(1, len(file_names)) ]
+    assert len(file_names) > 2
+
+    body = ""
+    for shard in file_names:
+        with opener(shard, "rt") as file:
+            text = file.read()
+        assert text.startswith(PREAMBLE) and text.endswith(EPILOGUE)
+        assert len(text) - len(EPILOGUE) <= max_shard_size or text.count("\n") == 3
+        body += text[len(PREAMBLE):-len(EPILOGUE)]
+    assert body == "".join(lines_of(generator))
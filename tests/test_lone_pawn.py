@@ -0,0 +1,23 @@
+from generate_horde_insufficient_material_tests import WrappedBoard
+from tests.helpers import position_corpus
+
+import chess
+
+
+def promotions_are_insufficient(board):
+    """The lone pawn promoted on the board to a queen and to a knight."""
+    pawn_square = chess.SquareSet(board.pawns & board.occupied_co[chess.WHITE]).pop()
+    verdicts = []
+    for piece_type in (chess.QUEEN, chess.KNIGHT):
+        promoted = WrappedBoard(board.fen())
+        promoted.set_piece_at(pawn_square, chess.Piece(piece_type, chess.WHITE))
+        verdicts.append(promoted.has_insufficient_material(chess.WHITE))
+    return all(verdicts)
+
+
+def test_lone_pawn_matches_its_promoted_boards():
+    boards = dict(position_corpus(2024, 500))["lone pawn"]
+    assert any( board.has_insufficient_material(chess.WHITE) for board in boards )
+    assert not all( board.has_insufficient_material(chess.WHITE) for board in boards )
+    for board in boards:
+        assert board.has_insufficient_material(chess.WHITE) == promotions_are_insufficient(board), board.fen()
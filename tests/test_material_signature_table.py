@@ -0,0 +1,79 @@
+from generate_horde_insufficient_material_tests import MaterialSignatureTable, WrappedBoard
+from tests.helpers import position_corpus
+
+import pytest
+
+
+# Hand-built positions with the verdict for white.
+KNOWN_VERDICTS = [
+    ("8/8/8/8/8/8/8/k1Q5 b - - 0 1", True),
+    ("8/8/8/8/8/8/p7/k1Q5 b - - 0 1", False),
+    ("8/8/8/8/8/8/r7/k1Q5 b - - 0 1", False),
+    ("8/8/8/8/8/2Q5/b7/kb6 b - - 0 1", False),
+    ("8/8/8/8/8/2Q5/8/kn6 b - - 0 1", True),
+    ("8/8/8/8/8/8/8/kR6 b - - 0 1", True),
+    ("kr6/1n6/R7/8/8/8/8/8 b - - 0 1", False),
+    ("8/8/8/8/8/2B5/p7/kb6 b - - 0 1", False),
+    ("8/8/8/8/8/2B5/8/kq6 b - - 0 1", True),
+    ("8/8/8/8/8/8/qbN5/kr6 b - - 0 1", False),
+    ("8/8/8/8/8/8/1bN5/kr6 b - - 0 1", True),
+    ("8/8/8/8/8/2N5/1nN5/k7 b - - 0 1", False),
+    ("8/8/8/8/8/2N5/2N5/k7 b - - 0 1", True),
+    ("8/8/8/8/8/2B5/b1B5/k7 b - - 0 1", False),
+    ("8/8/8/8/8/1BB5/8/k7 b - - 0 1", True),
+    ("8/8/8/8/8/8/bB6/knB5 b - - 0 1", False),
+    ("8/8/8/8/8/1B1B4/8/k7 b - - 0 1", True),
+    ("8/8/8/8/8/2B5/b2N4/k7 b - - 0 1", False),
+    ("8/8/8/8/8/2B5/3N4/k7 b - - 0 1", True),
+    ("8/8/8/8/8/2N5/8/kR6 b - - 0 1", False),
+    ("8/8/8/8/8/1NNN4/8/k7 b - - 0 1", False),
+    ("8/8/8/4B3/1N6/8/1B1N4/1k6 b - - 0 1", False),
+    ("8/8/8/8/8/8/1P6/k7 b - - 0 1", True),
+    ("8/8/8/8/8/8/1P6/kb6 b - - 0 1", True),
+    ("8/8/8/8/pppp4/8/1B6/k7 b - - 0 1", False),
+    ]
+
+
+@pytest.mark.parametrize("fen, is_insufficient", KNOWN_VERDICTS)
+def test_known_verdicts(fen, is_insufficient):
+    board = WrappedBoard(fen)
+    assert board.has_insufficient_material_compiled(True) == is_insufficient
+    assert board.has_insufficient_material(True) == is_insufficient
+
+
+def test_compiled_verdicts_match_the_classifier():
+    """The positions of every rule branch get the same verdict from the table."""
+    for branch, boards in position_corpus(2024, 200):
+        for board in boards:
+            assert board.has_insufficient_material_compiled(True) == board.has_insufficient_material(True), (branch, board.fen())
+
+
+def test_black_to_mate_is_never_insufficient():
+    for branch, boards in position_corpus(2024, 20):
+        for board in boards:
+            assert board.has_insufficient_material_compiled(False) == False
+
+
+def test_batch_verdicts_match_the_table():
+    """Skipped without numpy, like the batch classifier is optional."""
+    np = pytest.importorskip("numpy")
+    boards = [ board for branch, boards in position_corpus(2024, 200) for board in boards ]
+    columns = [
+        [ board.occupied_co[True] for board in boards ],
+        [ board.occupied_co[False] for board in boards ],
+        [ board.pawns for board in boards ],
+        [ board.knights for board in boards ],
+        [ board.bishops for board in boards ],
+        [ board.rooks for board in boards ],
+        [ board.queens for board in boards ],
+        ]
+    verdicts = MaterialSignatureTable.default().is_insufficient_batch(*[ np.array(column, dtype=np.uint64) for column in columns ])
+    assert verdicts.tolist() == [ board.has_insufficient_material_compiled(True) for board in boards ]
+
+
+def test_missing_table_is_not_compiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(MaterialSignatureTable, "path", str(tmp_path/"missing.bin"))
+    monkeypatch.setattr(MaterialSignatureTable, "_MaterialSignatureTable__default", None)
+    with pytest.raises(FileNotFoundError, match="compile_insufficient_material_table.py"):
+        MaterialSignatureTable.default()
+    assert not (tmp_path/"missing.bin").exists()
@@ -0,0 +1,31 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns
+
+from chess import A1, A2, B2, WHITE
+import pytest
+
+
+def generate_patterns(white_sides, king_squares, processes=1):
+    generator = GenerateTestsFromPatterns()
+    generator.generate_patterns(white_sides=white_sides, king_squares=king_squares, processes=processes)
+    return generator
+
+
+def stored(generator):
+    return [ (test.position, test.is_insufficient, test.comment) for test in generator.store ]
+
+
+@pytest.mark.parametrize("white_sides, king_squares", [
+    ([["R"], ["Q"], ["R","R"]], [A1, A2, B2]),
+    ([["R","N"], ["Q","D"]], [A1]),
+    ])
+def test_rook_and_queen_patterns_agree_with_the_classifier(white_sides, king_squares):
+    generator = generate_patterns(white_sides, king_squares)
+    tests = [ test for test in generator.store ]
+    assert tests
+    for test in tests:
+        assert test.is_insufficient == test.has_insufficient_material(WHITE), test.fen()
+
+
+def test_parallel_search_matches_a_single_process():
+    white_sides = [["D"], ["N"], ["R"], ["Q"], ["D","L"], ["R","N"]]
+    assert stored(generate_patterns(white_sides, [A1, A2], 2)) == stored(generate_patterns(white_sides, [A1, A2]))
@@ -0,0 +1,40 @@
+from generate_horde_insufficient_material_tests import WrappedBoard
+from tests.helpers import position_corpus
+
+from random import Random
+
+
+def random_game_positions(random, plies):
+    """The positions of a random game, with castling rights, en passant squares and move counters."""
+    board = WrappedBoard()
+    board.reset()
+    positions = []
+    for _ in range(plies):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(random.choice(moves))
+        positions.append(WrappedBoard(board.fen()))
+    return positions
+
+
+def test_position_keys_tell_positions_apart_like_fens():
+    random = Random(2024)
+    boards = [ board for branch, boards in position_corpus(2024, 50) for board in boards ]
+    boards += [ board for _ in range(20) for board in random_game_positions(random, 80) ]
+    boards += [ board.mirror_vertical() for board in boards[:200] ]
+    fens = dict()
+    for board in boards:
+        assert fens.setdefault(board.position_key(), board.fen()) == board.fen()
+    assert len(fens) == len(set( board.fen() for board in boards ))
+    assert any( board.ep_square is not None for board in boards )
+
+
+def test_copies_share_the_key():
+    board = WrappedBoard("r3k2r/8/8/3pP3/8/8/8/R3K2R w KQkq d6 0 12")
+    assert board.deepcopy().position_key() == board.position_key()
+    assert board.deepcopy().fen() == board.fen()
+    for fen in ("r3k2r/8/8/3pP3/8/8/8/R3K2R w Kkq d6 0 12", "r3k2r/8/8/3pP3/8/8/8/R3K2R w KQkq - 0 12",
+                "r3k2r/8/8/3pP3/8/8/8/R3K2R b KQkq d6 0 12", "r3k2r/8/8/3pP3/8/8/8/R3K2R w KQkq d6 1 12",
+                "r3k2r/8/8/3pP3/8/8/8/R3K2R w KQkq d6 0 13", "r3k2r/8/8/3pP3/8/8/8/R3K1R1 w Qkq d6 0 12"):
+        assert WrappedBoard(fen).position_key() != board.position_key()
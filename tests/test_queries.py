@@ -0,0 +1,81 @@
+from generate_horde_insufficient_material_tests import DominanceIndex, GenerateTestsFromPatterns
+from tests.helpers import position_corpus
+
+from chess import A2, C1
+from itertools import product
+from random import Random
+import pytest
+
+
+@pytest.fixture(scope="module")
+def generator():
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    generator.brute_force_and_assess_positions(3, whites=[["Q"], ["N"], ["B","B"], ["R","N"]])
+    return generator
+
+
+def all_tests(generator):
+    return [ test for test in generator.store ]
+
+
+RELATIONS = {
+    "subset": lambda test, board: test <= board,
+    "superset": lambda test, board: board <= test,
+    "exactly": lambda test, board: (test.white_composition, test.black_composition) == (board.white_composition, board.black_composition),
+    }
+
+
+@pytest.mark.parametrize("relation", list(RELATIONS))
+def test_queries_match_a_scan(generator, relation):
+    tests = all_tests(generator)
+    boards = [ board for branch, boards in position_corpus(2024, 20) for board in boards ]
+    boards += [ test.to_board() for test in tests[::50] ]
+    found = 0
+    for board in boards:
+        board.compute_white_composition()
+        board.compute_black_composition()
+        for is_insufficient in (None, True, False):
+            expected = [ test for test in tests if RELATIONS[relation](test, board) and is_insufficient in (None, test.is_insufficient) ]
+            assert sorted( test.position for test in generator.query(board, relation, is_insufficient) ) == sorted( test.position for test in expected )
+            found += len(expected)
+    assert found > 0
+
+
+def test_unknown_relation(generator):
+    with pytest.raises(ValueError):
+        generator.query(all_tests(generator)[0], "overlaps")
+
+
+def test_dominance_index_queries_from_both_sides():
+    random = Random(2024)
+    index = DominanceIndex(4)
+    keys = [ tuple( random.randint(0, 3) for _ in range(4) ) for _ in range(300) ]
+    for n, key in enumerate(keys):
+        index.add(key, n)
+    for bounds in product(range(-1, 5), repeat=4):
+        if random.random() > .2:
+            continue
+        assert list(index.candidates(bounds)) == [ n for n, key in enumerate(keys) if all( k <= b for k, b in zip(key, bounds) ) ]
+        assert list(index.candidates_above(bounds)) == [ n for n, key in enumerate(keys) if all( k >= b for k, b in zip(key, bounds) ) ]
+
+
+def test_dominance_index_removal():
+    """The removed entries drop out of the queries, which keep the insertion order, and their slots get reclaimed."""
+    random = Random(2025)
+    index = DominanceIndex(4)
+    keys = [ tuple( random.randint(0, 3) for _ in range(4) ) for _ in range(300) ]
+    for n, key in enumerate(keys):
+        index.add(key, n)
+    live = dict(enumerate(keys))
+    for n in random.sample(range(300), 250):
+        index.remove(n)
+        del live[n]
+        assert len(index) == len(live)
+        assert len(index.entries) <= 2*len(live)+1
+        if n%10 == 0:
+            for bounds in [ tuple( random.randint(0, 3) for _ in range(4) ) for _ in range(5) ]:
+                assert list(index.candidates(bounds)) == [ m for m, key in live.items() if all( k <= b for k, b in zip(key, bounds) ) ]
+                assert list(index.candidates_above(bounds)) == [ m for m, key in live.items() if all( k >= b for k, b in zip(key, bounds) ) ]
+    index.remove("not there")
+    assert len(index) == len(live)
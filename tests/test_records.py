@@ -0,0 +1,46 @@
+import generate_horde_insufficient_material_tests as generator_module
+from tests.helpers import position_corpus
+
+import chess
+
+
+def records_of(boards, name):
+    for board in boards:
+        board.comment = name
+        board.compute_white_composition()
+        board.compute_black_composition()
+        yield board, generator_module.TestRecord.from_board(board)
+
+
+def test_records_round_trip_to_their_boards():
+    for branch, boards in position_corpus(2024, 50):
+        for board, record in records_of(boards, branch):
+            restored = record.to_board()
+            assert restored.fen() == record.fen() == board.fen()
+            assert record.position_key() == board.position_key()
+            assert (restored.comment, restored.is_insufficient) == (branch, board.is_insufficient)
+            assert (record.white_composition, record.black_composition) == (board.white_composition, board.black_composition)
+
+
+def test_records_read_like_boards():
+    for branch, boards in position_corpus(2024, 50):
+        for board, record in records_of(boards, branch):
+            assert (record.pawns, record.knights, record.bishops, record.rooks, record.queens, record.kings) == (
+                board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+            assert tuple(record.occupied_co) == tuple(board.occupied_co)
+            assert record.has_insufficient_material(chess.WHITE) == board.has_insufficient_material(chess.WHITE)
+            assert record.has_insufficient_material_compiled(chess.WHITE) == board.has_insufficient_material_compiled(chess.WHITE)
+
+
+def test_mirrored_records_keep_their_pattern():
+    for branch, boards in position_corpus(2024, 10):
+        for board, record in records_of(boards, branch):
+            mirrored = record.mirror_vertical()
+            assert mirrored.fen() == board.mirror_vertical().fen()
+            assert mirrored.comment == branch
+
+
+def test_sufficient_subset_is_kept():
+    board, record = next(records_of([ position_corpus(2024, 1)[0][1][0] ], "subset"))
+    board.sufficient_subset = (board.white_composition, board.black_composition)
+    assert generator_module.TestRecord.from_board(board).sufficient_subset == board.sufficient_subset
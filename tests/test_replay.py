@@ -0,0 +1,90 @@
+from replay_horde_corpus import audit_fens, audit_games, read_horde_games, replay
+
+from chess import Board
+from chess.pgn import Game
+from chess.variant import HordeBoard
+from gzip import open as open_gzip
+from io import StringIO
+from random import Random
+
+
+def random_game(random, max_moves, **headers):
+    """
+    The PGN of a random Horde game, with the number of moves that changed the material
+    and whether the last one did.
+    """
+    board = HordeBoard()
+    changes = []
+    for _ in range(max_moves):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        move = random.choice(moves)
+        changes.append( board.is_capture(move) or move.promotion is not None )
+        board.push(move)
+    game = Game.from_board(board)
+    game.headers.update(headers)
+    return str(game)+"\n\n", sum(changes), changes[-1]
+
+
+def test_positions_are_assessed_once():
+    """After every capture or promotion, and the final position if its move changed nothing."""
+    random = Random(2024)
+    for _ in range(20):
+        text, changes, final_changed = random_game(random, random.randint(1, 200))
+        report = audit_games([text])
+        assert report.games == 1
+        assert report.positions == changes + (not final_changed)
+        assert report.disagreements() == 0
+
+
+def test_time_forfeit_results():
+    """White to move flagged, so black wins whatever the material."""
+    board = HordeBoard()
+    board.push_san("e5")
+    board.push_san("d6")
+    game = Game.from_board(board)
+    game.headers.update({"Termination": "Time forfeit", "Result": "1-0"})
+    report = audit_games([str(game)])
+    assert report.timeouts == 1
+    assert report.disagreements("result") == 1
+    game.headers["Result"] = "0-1"
+    assert audit_games([str(game)]).disagreements() == 0
+
+
+def test_other_variants_are_skipped():
+    standard = Game.from_board(Board())
+    standard.headers["Site"] = "standard"
+    text, changes, final_changed = random_game(Random(2024), 30, Site="horde")
+    corpus = str(standard)+"\n\n"+text
+    assert [ game.split("\n")[1] for game in read_horde_games(StringIO(corpus)) ] == ['[Site "horde"]']
+    report = audit_games([str(standard)])
+    assert (report.games, report.positions) == (0, 0)
+
+
+def test_fen_dump():
+    report = audit_fens([
+        "8/8/8/8/8/8/8/k1Q5 b - - 0 1,true,lone queen",
+        "8/8/8/8/8/8/p7/k1Q5 b - - 0 1,true,wrong",
+        "not a fen",
+        ])
+    assert (report.positions, report.errors) == (2, 1)
+    assert report.disagreements("expected") == 1
+    assert report.disagreements("library") == 0
+
+
+def test_replay_in_workers_matches_one_process(tmp_path):
+    random = Random(2024)
+    games = tmp_path/"games.pgn.gz"
+    with open_gzip(games, "wt") as file:
+        for n in range(30):
+            file.write(random_game(random, random.randint(1, 300), Termination="Time forfeit", Result=random.choice(["1-0", "0-1", "1/2-1/2"]))[0])
+    fens = tmp_path/"tests.csv"
+    fens.write_text("8/8/8/8/8/8/8/k1Q5 b - - 0 1,true,lone queen\n8/8/8/8/8/8/p7/k1Q5 b - - 0 1,true,wrong\nnot a fen\n")
+
+    def counts(report):
+        return report.games, report.positions, report.timeouts, report.errors, { key: count for key, (count, examples) in report.groups.items() }
+
+    serial = replay([str(games), str(fens)], batch_size=4)
+    assert (serial.games, serial.timeouts, serial.errors) == (30, 30, 1)
+    assert counts(replay([str(games), str(fens)], processes=2, batch_size=4)) == counts(serial)
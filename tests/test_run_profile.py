@@ -0,0 +1,32 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns
+
+from chess import A1, A2
+import json
+import pytest
+
+
+@pytest.mark.parametrize("by_composition", [False, True])
+def test_manifest_counters(tmp_path, by_composition):
+    """The counters of a small run, read back from its manifest."""
+    generator = GenerateTestsFromPatterns()
+    generator.generate_patterns(white_sides=[["D"], ["N"], ["D","L"]], king_squares=[A1, A2])
+    generator.correct_contradictions()
+    generator.brute_force_and_assess_positions(3, whites=[["B"], ["N"]], by_composition=by_composition)
+    generator.export_to(str(tmp_path/"tests.txt"), formatting=lambda test: test.fen()+"\n")
+    tests = list(generator.store)
+    for test in tests[:3]:
+        test.is_insufficient = not test.is_insufficient
+    assert len(generator.verify()) == 3
+
+    path = tmp_path/"manifest.json"
+    generator.profile.write_manifest(str(path), tests=len(generator))
+    manifest = json.loads(path.read_text())
+    counters = manifest["counters"]
+
+    assert manifest["tests"] == len(tests) == counters["tests"]
+    assert counters["boards"] > 0
+    assert counters["fens"] == 3
+    assert counters["has_insufficient_material"] == 2*len(tests)
+    assert counters["subset queries"] > counters["subset hits"] > 0
+    assert manifest["subset_hit_rate"] == counters["subset hits"]/counters["subset queries"]
+    assert set(manifest["phases"]) >= {"generate_patterns", "brute_force_and_assess_positions", "correct_contradictions", "export_to", "verify"}
@@ -0,0 +1,67 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns, SQLiteTestStore
+
+from chess import A1, A2, C1
+
+
+def generate(store=None):
+    generator = GenerateTestsFromPatterns(store=store)
+    generator.generate_patterns(white_sides=[["D"], ["N"], ["D","L"]], king_squares=[A1, A2])
+    generator.correct_contradictions()
+    generator.brute_force_and_assess_positions(3, whites=[["B"], ["N"]], by_composition=True)
+    generator.correct_contradictions()
+    return generator
+
+
+def stored(tests):
+    return [ (test.position, test.white_composition, test.black_composition, test.is_insufficient, test.comment, test.sufficient_subset) for test in tests ]
+
+
+def test_sqlite_store_matches_the_memory_store(tmp_path):
+    """The store is paged and flushed in small batches, and reopened at the end."""
+    path = str(tmp_path/"tests.db")
+    memory = generate().store
+    sqlite = generate(SQLiteTestStore(path, batch_size=100)).store
+
+    assert len(sqlite) == len(memory)
+    assert sqlite.names() == memory.names()
+    for name in memory.names():
+        assert sqlite.count(name) == memory.count(name)
+        assert stored(sqlite[name]) == stored(memory[name])
+    assert stored(sqlite) == stored(memory)
+    assert stored( test for tests in sqlite.batches() for test in tests ) == stored(memory)
+    assert sqlite.count("no such pattern") == 0
+
+    for white_comp, black_comp in set( (test.white_composition, test.black_composition) for test in memory ):
+        for query in ("subsets_of", "supersets_of", "exactly"):
+            assert sorted(stored(getattr(sqlite, query)(white_comp, black_comp))) == sorted(stored(getattr(memory, query)(white_comp, black_comp))), query
+
+    sqlite.close()
+    assert stored(SQLiteTestStore(path)) == stored(memory)
+
+
+def test_sqlite_store_skips_flushed_positions(tmp_path):
+    """The same pattern added again, once its tests are in the database."""
+    generator = GenerateTestsFromPatterns(store=SQLiteTestStore(str(tmp_path/"tests.db"), batch_size=2))
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    generator.store.flush()
+    tests = stored(generator.store)
+    assert all( position in generator.store for position, *rest in tests )
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    generator.correct_contradictions()
+    assert len(generator.store) == len(tests)
+    assert stored(generator.store) == tests
+
+
+def test_sqlite_store_ignores_stored_positions_on_flush(tmp_path):
+    """A test added without the dedupe check is dropped by the flush, and unknown names are not stored."""
+    generator = GenerateTestsFromPatterns(store=SQLiteTestStore(str(tmp_path/"tests.db"), batch_size=2))
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    store = generator.store
+    tests = stored(store)
+    names = store.names()
+    for test in list(store):
+        store.add(test)
+    assert len(store) == len(tests)
+    assert stored(store) == tests
+    assert list(store["no such pattern"]) == []
+    assert store.names() == names
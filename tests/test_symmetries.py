@@ -0,0 +1,85 @@
+import generate_horde_insufficient_material_tests as generator_module
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns, WrappedBoard
+
+from chess import A1, A2, B1, H8, Piece, square, square_file, square_rank
+from random import Random
+import pytest
+
+
+# Where each symmetry sends the square on (file, rank).
+SQUARE_MAPS = {
+    "identity": lambda f, r: (f, r),
+    "flip_files": lambda f, r: (7-f, r),
+    "flip_ranks": lambda f, r: (f, 7-r),
+    "rotate_180": lambda f, r: (7-f, 7-r),
+    "transpose": lambda f, r: (r, f),
+    "anti_transpose": lambda f, r: (7-r, 7-f),
+    "rotate_90": lambda f, r: (7-r, f),
+    "rotate_270": lambda f, r: (r, 7-f),
+    }
+
+
+def random_boards(seed, size):
+    random = Random(seed)
+    for _ in range(size):
+        board = WrappedBoard()
+        for sq in random.sample(range(64), random.randint(1, 12)):
+            board.set_piece_at(sq, Piece.from_symbol(random.choice("NBRQnbrq" if WrappedBoard.is_backrank(sq) else "PNBRQpnbrq")))
+        board.compute_white_composition()
+        board.compute_black_composition()
+        yield board
+
+
+def image_of(board, name):
+    """The image set up square by square."""
+    image = WrappedBoard()
+    for sq, piece in board.piece_map().items():
+        image.set_piece_at(square(*SQUARE_MAPS[name](square_file(sq), square_rank(sq))), piece)
+    image.compute_white_composition()
+    image.compute_black_composition()
+    return image
+
+
+def test_symmetries_move_the_pieces_and_the_bishop_colours():
+    for board in random_boards(2024, 200):
+        for symmetry in WrappedBoard.SYMMETRIES:
+            image, expected = board.transform_symmetry(symmetry), image_of(board, symmetry[0])
+            assert image.board_fen() == expected.board_fen()
+            assert (image.white_composition, image.black_composition) == (expected.white_composition, expected.black_composition)
+
+
+def test_records_and_keys_transform_like_boards():
+    for board in random_boards(2025, 100):
+        record = generator_module.TestRecord.from_board(board)
+        for symmetry in WrappedBoard.SYMMETRIES:
+            image = board.transform_symmetry(symmetry)
+            assert WrappedBoard.transform_position_key(board.position_key(), symmetry[1]) == image.position_key()
+            record_image = record.transform_symmetry(symmetry)
+            assert record_image.position == image.position_key()
+            assert (record_image.white_composition, record_image.black_composition) == (image.white_composition, image.black_composition)
+
+
+def test_pawns_only_keep_the_file_flip():
+    for board in random_boards(2026, 100):
+        symmetries = board.symmetries()
+        assert [ name for name, transform, swaps_colours in symmetries ] == (["identity", "flip_files"] if board.pawns else list(SQUARE_MAPS))
+        assert board.canonical_key() == min( board.transform_symmetry(symmetry).position_key() for symmetry in symmetries )
+
+
+def generate_patterns(white_sides, king_squares, full_search):
+    generator = GenerateTestsFromPatterns()
+    if full_search:
+        # Every (king square, white side) is searched on its own, with no images.
+        generator._GenerateTestsFromPatterns__orbit_searches = lambda king_squares, white_sides: {
+            (king, tuple(sorted(white_side))): [0] for king in king_squares for white_side in white_sides
+            }
+    generator.generate_patterns(white_sides=white_sides, king_squares=king_squares)
+    return sorted( (test.position, test.is_insufficient, test.comment) for test in generator.store )
+
+
+@pytest.mark.parametrize("white_sides, king_squares", [
+    ([["D"], ["N"], ["D","L"], ["D","D"]], [A1, A2, B1, H8]),
+    ([["N","N"]], [A1, H8]),
+    ])
+def test_symmetric_images_match_a_full_search(white_sides, king_squares):
+    assert generate_patterns(white_sides, king_squares, False) == generate_patterns(white_sides, king_squares, True)
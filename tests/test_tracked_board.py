@@ -0,0 +1,64 @@
+from generate_horde_insufficient_material_tests import TrackedBoard, WrappedBoard
+from tests.helpers import HORDE_START, position_corpus, random_game
+
+from chess import Piece
+from random import Random
+
+
+def assessed(board):
+    return WrappedBoard(board.fen()).has_insufficient_material(True)
+
+
+def replay(board, moves, random):
+    """Pushes the moves and pops them back, checking the verdicts and copies taken along the way."""
+    copies = []
+    for move in moves:
+        board.push(move)
+        assert board.has_insufficient_material(True) == assessed(board), board.fen()
+        if random.random() < 0.05:
+            copies.append( board.copy() )
+    while board.move_stack:
+        board.pop()
+        assert board.has_insufficient_material(True) == assessed(board), board.fen()
+    for copy in copies:
+        assert copy.has_insufficient_material(True) == assessed(copy), copy.fen()
+        copy.pop()
+        assert copy.has_insufficient_material(True) == assessed(copy), copy.fen()
+
+
+def random_moves(board, random, max_moves):
+    board = board.copy()
+    for _ in range(max_moves):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(random.choice(moves))
+    return board.move_stack
+
+
+def test_tracked_verdicts_match_a_fresh_board_in_games():
+    """Random games from the starting position, with many captures and promotions."""
+    random = Random(2024)
+    for _ in range(20):
+        replay(TrackedBoard(HORDE_START), random_game(random, max_moves=300), random)
+
+
+def test_tracked_verdicts_match_a_fresh_board_in_endgames():
+    """Random moves from the positions of every rule branch, where the verdicts change along the way."""
+    random = Random(2024)
+    for branch, boards in position_corpus(2024, 10):
+        for board in boards:
+            board = TrackedBoard(board.fen())
+            replay(board, random_moves(board, random, 60), random)
+
+
+def test_tracked_verdicts_after_setting_up_the_board():
+    board = TrackedBoard("8/8/8/8/8/8/8/k1Q5 b - - 0 1")
+    assert board.has_insufficient_material(True)
+    board.set_piece_at(8, Piece.from_symbol("p"))
+    assert board.has_insufficient_material(True) == assessed(board) == False
+    board.remove_piece_at(8)
+    assert board.has_insufficient_material(True) == assessed(board) == True
+    board.set_fen("8/8/8/8/8/2B5/p7/kb6 b - - 0 1")
+    assert board.has_insufficient_material(True) == assessed(board) == False
+    assert board.has_insufficient_material(False) == False
@@ -0,0 +1,69 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns, SQLiteTestStore
+import generate_horde_insufficient_material_tests as generator_module
+
+from chess import A2, C1
+import pytest
+
+
+@pytest.fixture
+def generator():
+    generator = GenerateTestsFromPatterns()
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    generator.correct_contradictions()
+    return generator
+
+
+def wrong_tests(generator):
+    """Flips every other verdict."""
+    tests = [ test for test in generator.store ]
+    for test in tests[::2]:
+        test.is_insufficient = not test.is_insufficient
+    return tests[::2]
+
+
+def summary(mismatches):
+    return [ (mismatch["fen"], mismatch["name"], mismatch["is_insufficient"], mismatch["has_insufficient_material"]) for mismatch in mismatches ]
+
+
+def test_verify_finds_the_wrong_verdicts(generator):
+    assert generator.verify() == []
+    wrong = wrong_tests(generator)
+    mismatches = generator.verify()
+    assert [ mismatch["test"] for mismatch in mismatches ] == wrong
+    assert all( mismatch["is_insufficient"] != mismatch["has_insufficient_material"] for mismatch in mismatches )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 50000])
+def test_parallel_verify_matches_a_single_process(generator, chunk_size):
+    wrong_tests(generator)
+    serial = generator.verify()
+    parallel = generator.verify(processes=2, chunk_size=chunk_size)
+    assert summary(parallel) == summary(serial)
+    assert [ mismatch["test"] for mismatch in parallel ] == [ mismatch["test"] for mismatch in serial ]
+
+
+def counting_pools(monkeypatch):
+    """Replaces the ProcessPoolExecutor of the generator by one that records its instances."""
+    pools = []
+    class CountedPool(generator_module.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            pools.append(self)
+    monkeypatch.setattr(generator_module, "ProcessPoolExecutor", CountedPool)
+    return pools
+
+
+@pytest.mark.parametrize("export", [False, True])
+def test_one_pool_checks_every_batch(tmp_path, monkeypatch, export):
+    """The tests get checked in batches of 2, with a single pool for the call."""
+    generator = GenerateTestsFromPatterns(store=SQLiteTestStore(str(tmp_path/"tests.db"), batch_size=2))
+    generator.add_pattern("white=Q", [(A2,"pr")], white=[(C1,"Q")])
+    pools = counting_pools(monkeypatch)
+    if export:
+        generator.export_to(str(tmp_path/"tests.py"), formatting=lambda test: test.fen()+"\n", processes=2)
+    else:
+        generator.correct_contradictions(processes=2)
+    assert len(pools) == 1
+    assert list(generator.store.unchecked_batches()) == []
+    assert generator.verify(processes=2, chunk_size=1) == []
+    assert len(pools) == 2
@@ -0,0 +1,45 @@
+from generate_horde_insufficient_material_tests import GenerateTestsFromPatterns, WhiteConfigurationCache
+
+from chess import A1, A2, B1
+import pytest
+
+
+def test_least_recently_used_entries_are_dropped():
+    cache = WhiteConfigurationCache(max_size=2)
+    cache.put(A1, ("D",), [1, 2])
+    cache.put(A2, ("N",), [3])
+    assert cache.get(A1, ("D",)) == [1, 2]
+    cache.put(B1, ("D","L"), [4])
+    assert len(cache) == 2
+    assert cache.get(A2, ("N",)) is None
+    assert cache.get(A1, ("D",)) == [1, 2]
+    assert cache.get(B1, ("D","L")) == [4]
+
+
+def test_save_and_load(tmp_path):
+    cache = WhiteConfigurationCache()
+    cache.put(A1, ("D",), [1, 2**200])
+    cache.put(A2, ("N","N"), [])
+    cache.save(tmp_path/"cache")
+    loaded = WhiteConfigurationCache.load(tmp_path/"cache")
+    assert list(loaded.entries.items()) == list(cache.entries.items())
+    assert len(WhiteConfigurationCache.load(tmp_path/"cache", max_size=1)) == 1
+
+
+def test_load_rejects_other_files(tmp_path):
+    (tmp_path/"cache").write_bytes(b"not a cache")
+    with pytest.raises(ValueError):
+        WhiteConfigurationCache.load(tmp_path/"cache")
+
+
+def test_cached_configurations_give_the_same_tests(tmp_path):
+    def generate_patterns(cache):
+        generator = GenerateTestsFromPatterns(cache)
+        generator.generate_patterns(white_sides=[["D"], ["N"], ["D","L"]], king_squares=[A1, A2])
+        return [ (test.position, test.is_insufficient, test.comment) for test in generator.store ], generator
+
+    cold, generator = generate_patterns(None)
+    assert len(generator.white_configurations) > 0
+    generator.white_configurations.save(tmp_path/"cache")
+    warm, generator = generate_patterns(WhiteConfigurationCache.load(tmp_path/"cache"))
+    assert warm == cold